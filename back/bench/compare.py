@@ -0,0 +1,34 @@
+# bench/compare.py
+# --- Сравнение двух прогонов bench.suite ---
+# Запуск из каталога back/:
+#     python -m bench.compare before.json after.json
+# Для каждой метрики — значения до/после и отношение after/before
+# (для *_per_sec больше — лучше, для *_ms и seconds — меньше).
+
+import json
+import sys
+
+METRICS = ("rows_per_sec", "messages_per_sec", "seconds", "first_ms", "p50_ms", "p95_ms")
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(before: dict, after: dict) -> list[tuple]:
+    rows = []
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if old is None:
+            continue
+        for metric in METRICS:
+            if old.get(metric) and new.get(metric) is not None:
+                rows.append((name, metric, old[metric], new[metric], new[metric] / old[metric]))
+    return rows
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m bench.compare before.json after.json")
+    before, after = _load(sys.argv[1]), _load(sys.argv[2])
+    print(f"before: {before.get('commit')}  after: {after.get('commit')}")
+    for name, metric, old, new, ratio in compare(before, after):
+        print(f"{name:<40} {metric:<18} {old:>12} {new:>12} {ratio:>8.2f}x")
@@ -0,0 +1,124 @@
+# bench/index_bench.py
+# --- Планы запросов до и после индексов миграции 0002 ---
+# Запуск из каталога back/:  python -m bench.index_bench [кол-во строк] [файл.json]
+#
+# В отдельной схеме bench создаётся синтетическая таблица flights
+# (по умолчанию 10 млн строк), для типовых запросов эндпоинтов снимается
+# EXPLAIN (ANALYZE, BUFFERS), затем к таблице применяется
+# migrations/0002_flight_indexes.sql и планы снимаются повторно.
+# Рабочая схема public не затрагивается.
+
+import json
+import sys
+
+from database import raw_connection
+from migrate import MIGRATIONS_DIR
+
+SCHEMA = "bench"
+
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Ростов-на-Дону",
+          "Хабаровск", "Красноярск", "Иркутск", "Якутск", "Тюмень", "Самара",
+          "Симферополь", "Магадан", "Калининград"]
+UAV_TYPES = ["BLA", "AER", "SHAR", "GEO", "QUAD", "HELI", "PLANE", "FIXW"]
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path = {SCHEMA}, public;
+CREATE TABLE flights (LIKE public.flights INCLUDING DEFAULTS);
+CREATE TABLE flight_daily_stats (LIKE public.flight_daily_stats INCLUDING DEFAULTS);
+INSERT INTO flights (flight_id, uav_type, reg_number, date, dep_time, arr_time,
+                     duration, dep_coord, dest_coord, min_alt, max_alt, route_coords, city)
+SELECT g,
+       (%(types)s::text[])[1 + (g %% %(n_types)s)],
+       'R' || (g %% 50000),
+       DATE '2023-01-01' + (g %% 1095),
+       TIME '00:00' + (g %% 1440) * INTERVAL '1 minute',
+       TIME '00:00' + ((g + 90) %% 1440) * INTERVAL '1 minute',
+       INTERVAL '90 minutes',
+       ST_SetSRID(ST_MakePoint(30 + random() * 100, 45 + random() * 20), 4326)::geography,
+       ST_SetSRID(ST_MakePoint(30 + random() * 100, 45 + random() * 20), 4326)::geography,
+       0, 150,
+       NULL,
+       (%(cities)s::text[])[1 + ((g / 7) %% %(n_cities)s)]
+FROM generate_series(1, %(rows)s) AS g;
+ALTER TABLE flights ADD PRIMARY KEY (flight_id);
+ANALYZE flights;
+"""
+
+# Типовые запросы эндпоинтов main.py к сырой таблице
+QUERIES = {
+    "filter_type_period": """
+        SELECT count(*) FROM flights
+        WHERE uav_type = 'QUAD' AND date BETWEEN '2024-03-01' AND '2024-03-31'
+    """,
+    "filter_city_period": """
+        SELECT count(*) FROM flights
+        WHERE city = 'Якутск' AND date BETWEEN '2024-01-01' AND '2024-06-30'
+    """,
+    "period_only": """
+        SELECT count(*) FROM flights
+        WHERE date BETWEEN '2024-05-01' AND '2024-05-07'
+    """,
+    "monthly_bucket": """
+        SELECT date_trunc('month', date::timestamp) AS m, count(*) FROM flights
+        WHERE date_trunc('month', date::timestamp) = '2024-02-01'
+        GROUP BY m
+    """,
+    "dep_within_10km": """
+        SELECT count(*) FROM flights
+        WHERE ST_DWithin(dep_coord, ST_SetSRID(ST_MakePoint(37.6, 55.75), 4326)::geography, 10000)
+    """,
+}
+
+def _explain(cur) -> dict:
+    plans = {}
+    for name, sql in QUERIES.items():
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        plan = cur.fetchone()[0][0]
+        plans[name] = {
+            "execution_ms": plan["Execution Time"],
+            "planning_ms": plan["Planning Time"],
+            "node": plan["Plan"]["Node Type"],
+            "plan": plan["Plan"],
+        }
+        print(f"  {name:22s} {plan['Execution Time']:10.1f} ms")
+    return plans
+
+def main(rows: int = 10_000_000, output: str | None = None):
+    # Генерация и EXPLAIN ANALYZE на 10 млн строк — дольше обычного statement_timeout
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        print(f"generating {rows:,} rows in schema {SCHEMA} ...")
+        cur.execute(SETUP_SQL, {
+            "rows": rows,
+            "types": UAV_TYPES, "n_types": len(UAV_TYPES),
+            "cities": CITIES, "n_cities": len(CITIES),
+        })
+        conn.commit()
+
+        print("before indexes:")
+        before = _explain(cur)
+
+        cur.execute(f"SET search_path = {SCHEMA}, public")
+        cur.execute((MIGRATIONS_DIR / "0002_flight_indexes.sql").read_text(encoding="utf-8"))
+        conn.commit()
+
+        print("after indexes:")
+        after = _explain(cur)
+
+        result = {"rows": rows, "before": before, "after": after}
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        cur.execute("RESET search_path")
+        conn.commit()
+        cur.close()
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    )
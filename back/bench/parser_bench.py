@@ -0,0 +1,143 @@
+# bench/parser_bench.py
+# --- Микробенчмарк parser.parse_message ---
+# Запуск из каталога back/:  python -m bench.parser_bench [кол-во сообщений]
+# Только сверка с эталоном, без замера (код выхода 1 при расхождении):
+#                             python -m bench.parser_bench --check [кол-во сообщений]
+#
+# Перед замером результат parse_message сверяется с эталонной
+# (исходной, многопроходной) реализацией на пограничных случаях EDGE_CASES
+# и синтетических сообщениях.
+
+import re
+import sys
+import time as _time
+from datetime import datetime, timedelta
+
+from parser import parse_message, convert_coord, calc_duration
+from bench.synthetic import make_messages
+
+# --- Эталонная реализация (до перехода на однопроходный токенизатор) ---
+
+def _reference_normalize_time(t):
+    if not t:
+        return None
+    t = re.sub(r'\D', '', str(t))
+    if len(t) >= 4:
+        try:
+            return datetime.strptime(t[:4], "%H%M").time()
+        except ValueError:
+            return None
+    return None
+
+def reference_parse_message(msg: str, region: str = None) -> dict:
+    result = {
+        "flight_id": None,
+        "uav_type": None,
+        "reg_number": "",
+        "date": None,
+        "dep_time": None,
+        "arr_time": None,
+        "duration": timedelta(seconds=0),
+        "dep_coord": "",
+        "dest_coord": "",
+        "city": region,
+        "min_alt": None,
+        "max_alt": None,
+        "route_coords": "",
+    }
+
+    if m := re.search(r"-M(\d{4})/M(\d{4})", msg):
+        result["min_alt"], result["max_alt"] = map(int, m.groups())
+
+    coords = re.findall(r"\d{4}[NS]\d{5}[EW]", msg)
+    converted = [convert_coord(c) for c in coords]
+    converted = [c for c in converted if c]
+
+    if len(converted) < 2:
+        result["route_coords"] = None
+    else:
+        linestring = ", ".join(f"{lon} {lat}" for lat, lon in converted)
+        result["route_coords"] = f"LINESTRING({linestring})"
+
+    if m := re.search(r"SID/([\w\d]+)", msg):
+        result["flight_id"] = m.group(1)
+    if m := re.search(r"TYP/([\w\d]+)", msg):
+        result["uav_type"] = m.group(1)
+    if m := re.search(r"REG/([\w\d]+)", msg):
+        result["reg_number"] = m.group(1)
+    if m := re.search(r"DOF/(\d{6})", msg):
+        try:
+            result["date"] = datetime.strptime(m.group(1), "%y%m%d").date()
+        except ValueError:
+            pass
+
+    times = re.findall(r"ZZZZ(\d{4,5})", msg)
+    if times:
+        result["dep_time"] = _reference_normalize_time(times[0]) if len(times) > 0 else None
+        result["arr_time"] = _reference_normalize_time(times[1]) if len(times) > 1 else None
+        flight_date = result["date"] or datetime.today().date()
+        result["duration"] = calc_duration(result["dep_time"], result["arr_time"], flight_date)
+
+    for key, prefix in [("dep_coord", "DEP"), ("dest_coord", "DEST")]:
+        if m := re.search(fr"{prefix}/(\d{{4,5}}[NS]\d{{4,5}}[EW])", msg):
+            if (latlon := convert_coord(m.group(1))):
+                lat, lon = latlon
+                result[key] = f"POINT({lon} {lat})"
+
+    return result
+
+# Пограничные случаи: пустые ячейки, неверные даты/время, поля внутри
+# значений других полей, 5-значные координаты DEP, южные/западные широты
+EDGE_CASES = [
+    "",
+    "nan",
+    "SID/123",
+    "REG/ABCSID/777 TYP/X",
+    "DOF/251399 -ZZZZ2460 -ZZZZ0930",
+    "DOF/250101 DOF/250202 -ZZZZ2330 -ZZZZ0015",
+    "-DEP/55301N037301E DEST/5530S03730W DEP/5530N03730E",
+    "-M0010/M0100 -M0020/M0200 5530N03730E",
+    "5530N03730E5530N03730E ZZZZZ12345 ZZZZ1234",
+    "12345N123456E 1234N12345W1234S12345E",
+]
+
+def check_equivalence(messages) -> int:
+    """Сверяет parse_message с эталоном, возвращает число проверенных сообщений."""
+    for msg in messages:
+        expected = reference_parse_message(msg, region="Москва")
+        actual = parse_message(msg, region="Москва")
+        if actual != expected:
+            raise AssertionError(f"Расхождение на сообщении {msg!r}:\n{actual}\n!=\n{expected}")
+    return len(messages)
+
+def _rate(func, messages) -> float:
+    started = _time.perf_counter()
+    for msg in messages:
+        func(msg)
+    return len(messages) / (_time.perf_counter() - started)
+
+def check(n: int = 50_000) -> int:
+    """Сверка на EDGE_CASES и n синтетических сообщениях."""
+    checked = check_equivalence(EDGE_CASES + make_messages(n))
+    print(f"equivalence: ok ({checked} messages)")
+    return checked
+
+def main(n: int = 50_000):
+    check(n)
+
+    messages = make_messages(n)
+    reference = _rate(reference_parse_message, messages)
+    current = _rate(parse_message, messages)
+    print(f"reference:     {reference:12,.0f} msg/s")
+    print(f"parse_message: {current:12,.0f} msg/s  (x{current / reference:.2f})")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--check"]
+    n = int(args[0]) if args else 50_000
+    if "--check" in sys.argv:
+        try:
+            check(n)
+        except AssertionError as e:
+            sys.exit(str(e))
+    else:
+        main(n)
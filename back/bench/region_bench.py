@@ -0,0 +1,54 @@
+# bench/region_bench.py
+# --- Поиск региона: индекс в памяти против запроса на точку ---
+# Запуск из каталога back/:  python -m bench.region_bench [кол-во точек]
+#
+# Сравнивает RegionIndex.lookup (STRtree, векторно) с crud.get_region_by_point
+# (ST_Contains, один запрос на точку) на случайных точках в границах РФ
+# и проверяет, что результаты совпадают.
+
+import sys
+import time as _time
+
+import numpy as np
+
+from crud import get_region_by_point
+from database import SessionLocal
+from region_index import RegionIndex, NO_REGION
+
+# Запрос на точку медленный — проверяем на ограниченной выборке
+SQL_SAMPLE = 500
+
+def main(n: int = 1_000_000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    lons = rng.uniform(20, 180, n)
+    lats = rng.uniform(41, 78, n)
+
+    db = SessionLocal()
+    try:
+        started = _time.perf_counter()
+        index = RegionIndex.from_db(db)
+        print(f"index load:   {_time.perf_counter() - started:8.3f} s ({len(index.ids)} regions)")
+
+        started = _time.perf_counter()
+        regions = index.lookup(lons, lats)
+        elapsed = _time.perf_counter() - started
+        memory_rate = n / elapsed
+        print(f"lookup:       {memory_rate:12,.0f} points/s ({n:,} points)")
+
+        sample = min(SQL_SAMPLE, n)
+        started = _time.perf_counter()
+        expected = []
+        for lon, lat in zip(lons[:sample], lats[:sample]):
+            region = get_region_by_point(db, float(lon), float(lat))
+            expected.append(region.id if region else NO_REGION)
+        sql_rate = sample / (_time.perf_counter() - started)
+        print(f"per-point SQL:{sql_rate:12,.0f} points/s ({sample:,} points)")
+        print(f"speedup:      x{memory_rate / sql_rate:,.0f}")
+
+        mismatches = int(np.count_nonzero(regions[:sample] != np.array(expected)))
+        print(f"mismatches:   {mismatches} of {sample}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
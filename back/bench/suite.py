@@ -0,0 +1,220 @@
+# bench/suite.py
+# --- Набор бенчмарков: парсер, загрузка и эндпоинты чтения ---
+# Запуск из каталога back/ при запущенных backend и PostGIS (docker-compose up):
+#     python -m bench.suite [--rows 20000] [--base-url http://localhost:8000]
+#                           [--repeat 20] [--output bench.json] [--skip-http]
+#
+# Этапы:
+# - parse_message: сообщений/с на синтетических сообщениях;
+# - parse_excel / iter_excel: строк/с на синтетической книге (1 и PARSE_WORKERS процессов);
+# - upload: POST /upload/ и /flights/import-xlsx (фоновая задача, ожидание /jobs/{id}),
+#   для каждого эндпоинта своя книга — повторные строки не пропускаются;
+# - read: каждый GET-эндпоинт чтения — первый запрос (холодный кеш ответов) и
+#   p50/p95 повторных.
+# Результат — JSON (коммит, параметры, метрики); сравнение двух прогонов:
+#     python -m bench.compare before.json after.json
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time as _time
+from datetime import datetime, timezone
+
+import requests
+
+from parser import parse_message, parse_excel, iter_excel, PARSE_WORKERS
+from bench.synthetic import make_messages, make_workbook
+
+# Москва: тайлы карты для бенчмарка /tiles
+_LON, _LAT = 37.62, 55.75
+
+def _tile(z: int) -> str:
+    n = 2 ** z
+    x = int((_LON + 180) / 360 * n)
+    lat = math.radians(_LAT)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return f"/tiles/{z}/{x}/{y}.mvt"
+
+# Эндпоинты чтения main.py и роутеров: имя → (путь, параметры)
+_PERIOD = {"startDate": "2025-03-01", "endDate": "2025-05-31"}
+READ_ENDPOINTS = {
+    "flights_page": ("/flights/", {"limit": 100}),
+    "flights_page_fields": ("/flights/", {"limit": 1000, "fields": "uav_type,city,date"}),
+    "flights_ndjson": ("/flights/", {"format": "ndjson", **_PERIOD}),
+    "flights_geojson": ("/flights/geojson", {**_PERIOD, "tolerance": 0.01}),
+    "types": ("/flights/types", {}),
+    "cities": ("/flights/cities", {}),
+    "stats": ("/flights/stats", {}),
+    "stats_filtered": ("/flights/stats", {"uav_type": "QUAD", **_PERIOD}),
+    "stats_yearly": ("/flights/stats/yearly", {}),
+    "monthly": ("/flights/monthly", {}),
+    "top_city": ("/flights/top", {"groupBy": "city"}),
+    "top_uav_type": ("/flights/top", {"groupBy": "uav_type"}),
+    "top_date": ("/flights/top", {"groupBy": "date"}),
+    "dashboard": ("/flights/dashboard", {}),
+    "regions_stats": ("/regions/stats", {}),
+    "regions_top": ("/regions/top", {}),
+    "tile_z6": (_tile(6), {}),
+    "tile_z12": (_tile(12), {}),
+    "cube_city_month": ("/flights/cube", {"dimensions": "city,month", "measures": "count,avg_duration"}),
+    "cube_hour_top": ("/flights/cube", {"dimensions": "city,hour", "measures": "count,max_alt", "top": 10}),
+    "distribution_city": ("/flights/distribution", {"groupBy": "city"}),
+    "stats_aircraft": ("/flights/stats/aircraft", {"groupBy": "uav_type"}),
+    "occupancy_city": ("/flights/occupancy", {"groupBy": "city", **_PERIOD}),
+    "spatial_radius": ("/flights/spatial", {"target": "dep", "lon": _LON, "lat": _LAT, "radius": 20000}),
+    "spatial_bbox_agg": ("/flights/spatial", {"bbox": "36.8,55.1,38.4,56.2", "dimensions": "uav_type"}),
+    "export_parquet": ("/flights/export.parquet", _PERIOD),
+    "export_arrow": ("/flights/export.arrow", _PERIOD),
+}
+
+UPLOAD_ENDPOINTS = ["/upload/", "/flights/import-xlsx"]
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else None
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+# --- Парсер ---
+
+def bench_parse_message(n: int) -> dict:
+    messages = make_messages(n, seed=1)
+    started = _time.perf_counter()
+    for msg in messages:
+        parse_message(msg)
+    elapsed = _time.perf_counter() - started
+    return {"messages": n, "seconds": round(elapsed, 3), "messages_per_sec": _rate(n, elapsed)}
+
+def bench_parse_excel(workbook: bytes, rows: int) -> dict:
+    result = {}
+    for workers in sorted({1, PARSE_WORKERS}):
+        started = _time.perf_counter()
+        parse_excel(workbook, workers=workers)
+        elapsed = _time.perf_counter() - started
+        result[f"parse_excel_w{workers}"] = {"seconds": round(elapsed, 3), "rows_per_sec": _rate(rows, elapsed)}
+
+        started = _time.perf_counter()
+        for _ in iter_excel(workbook, workers=workers):
+            pass
+        elapsed = _time.perf_counter() - started
+        result[f"iter_excel_w{workers}"] = {"seconds": round(elapsed, 3), "rows_per_sec": _rate(rows, elapsed)}
+    return result
+
+# --- HTTP ---
+
+def bench_upload(base_url: str, path: str, workbook: bytes, rows: int, timeout: float = 3600) -> dict:
+    """Загрузка книги и ожидание завершения фоновой задачи."""
+    started = _time.perf_counter()
+    response = requests.post(
+        base_url + path,
+        files={"file": ("bench.xlsx", workbook,
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+    )
+    response.raise_for_status()
+    accepted = _time.perf_counter() - started
+    job_id = response.json()["job_id"]
+
+    while True:
+        job = requests.get(f"{base_url}/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            break
+        if _time.perf_counter() - started > timeout:
+            raise TimeoutError(f"job {job_id} is still {job['status']}")
+        _time.sleep(0.2)
+    elapsed = _time.perf_counter() - started
+
+    return {
+        "status": job["status"],
+        "error": job["error"],
+        "rows": rows,
+        "rows_inserted": job["rows_inserted"],
+        "accept_ms": round(accepted * 1000, 1),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": _rate(rows, elapsed),
+    }
+
+def bench_read(base_url: str, path: str, params: dict, repeat: int) -> dict:
+    """Первый запрос и repeat повторных: задержка (мс) и размер ответа."""
+    timings = []
+    size = 0
+    status = None
+    for _ in range(repeat + 1):
+        started = _time.perf_counter()
+        response = requests.get(base_url + path, params=params)
+        body = response.content
+        timings.append((_time.perf_counter() - started) * 1000)
+        size, status = len(body), response.status_code
+    warm = timings[1:] or timings
+    return {
+        "status": status,
+        "bytes": size,
+        "first_ms": round(timings[0], 2),
+        "p50_ms": round(statistics.median(warm), 2),
+        "p95_ms": round(_percentile(warm, 0.95), 2),
+        "max_ms": round(max(warm), 2),
+    }
+
+# --- Запуск ---
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(rows: int, base_url: str, repeat: int, skip_http: bool = False) -> dict:
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {"rows": rows, "repeat": repeat, "parse_workers": PARSE_WORKERS, "base_url": base_url},
+        "results": {},
+    }
+    results = report["results"]
+
+    print("parse_message ...")
+    results["parse_message"] = bench_parse_message(rows)
+
+    print(f"synthetic workbook: {rows:,} rows ...")
+    workbook = make_workbook(rows, seed=2)
+    report["params"]["workbook_bytes"] = len(workbook)
+    print("parse_excel / iter_excel ...")
+    results.update(bench_parse_excel(workbook, rows))
+
+    if not skip_http:
+        for seed, path in enumerate(UPLOAD_ENDPOINTS, start=100):
+            print(f"upload {path} ...")
+            results[f"upload {path}"] = bench_upload(base_url, path, make_workbook(rows, seed=seed), rows)
+
+        for name, (path, params) in READ_ENDPOINTS.items():
+            print(f"read {name} ...")
+            results[f"read {name}"] = bench_read(base_url, path, params, repeat)
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки парсера, загрузки и эндпоинтов чтения")
+    parser.add_argument("--rows", type=int, default=20_000, help="строк в синтетической книге")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--repeat", type=int, default=20, help="повторов каждого запроса чтения")
+    parser.add_argument("--output", help="файл для JSON-результата")
+    parser.add_argument("--skip-http", action="store_true", help="только парсер, без backend")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.base_url.rstrip("/"), args.repeat, args.skip_http)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench/synthetic.py
+# --- Генератор синтетических сообщений ОрВД для бенчмарков ---
+
+import random
+from datetime import date, timedelta
+from io import BytesIO
+
+from openpyxl import Workbook
+
+UAV_TYPES = ["BLA", "AER", "SHAR", "GEO", "QUAD"]
+REGIONS = [
+    "Московский", "Санкт-Петербургский", "Ростовский", "Новосибирский",
+    "Екатеринбургский", "Хабаровский", "Красноярский", "Самарский",
+]
+
+def _coord(rng: random.Random) -> str:
+    """Случайная точка в формате DDMMNDDDMME."""
+    return (
+        f"{rng.randint(41, 70):02d}{rng.randint(0, 59):02d}N"
+        f"{rng.randint(20, 170):03d}{rng.randint(0, 59):02d}E"
+    )
+
+def make_message(rng: random.Random, start: date = date(2025, 1, 1), days: int = 365) -> str:
+    """
+    Формирует сообщение в формате SID/TYP/REG/DOF/DEP/DEST/ZZZZ,
+    который понимает parser.parse_message.
+    """
+    dof = start + timedelta(days=rng.randrange(days))
+    dep = _coord(rng)
+    dest = _coord(rng) if rng.random() < 0.7 else dep
+    route = " ".join(_coord(rng) for _ in range(rng.randint(0, 6)))
+    dep_time = f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}"
+    arr_time = f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}"
+    return (
+        f"(SHR-ZZZZZ -ZZZZ{dep_time} -M{rng.randint(0, 50):04d}/M{rng.randint(50, 300):04d} "
+        f"/ZONA {route}/ -ZZZZ{arr_time} "
+        f"-DEP/{dep} DEST/{dest} DOF/{dof:%y%m%d} "
+        f"REG/{rng.randint(0, 9999):04d}J{rng.randint(10, 99)} "
+        f"TYP/{rng.choice(UAV_TYPES)} SID/{rng.randint(10**9, 10**10 - 1)})"
+    )
+
+def make_messages(n: int, seed: int = 0) -> list[str]:
+    """Список из n синтетических сообщений (детерминирован по seed)."""
+    rng = random.Random(seed)
+    return [make_message(rng) for _ in range(n)]
+
+# Заголовок листа выгрузки ОрВД: регион и ячейки сообщений
+WORKBOOK_HEADER = ["Центр ЕС ОрВД", "SHR", "DEP", "ARR"]
+
+def make_workbook(rows: int, seed: int = 0, path: str | None = None) -> bytes | None:
+    """
+    Формирует книгу Excel в формате выгрузки ОрВД из rows строк:
+    регион и сообщение SHR (в части строк — ещё DEP/ARR с тем же SID).
+    Книга пишется в режиме write_only, поэтому размер не ограничен памятью.
+    Возвращает байты книги или, если задан path, сохраняет её в файл.
+    """
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(WORKBOOK_HEADER)
+    for _ in range(rows):
+        shr = make_message(rng)
+        row = [rng.choice(REGIONS), shr, None, None]
+        if rng.random() < 0.3:
+            # Повтор SHR в ячейках DEP/ARR: проверяет слияние полей строки
+            row[2] = shr
+        ws.append(row)
+
+    if path:
+        wb.save(path)
+        return None
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
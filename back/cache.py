@@ -0,0 +1,237 @@
+# cache.py
+# --- Кеш ответов эндпоинтов статистики ---
+# Ответы кешируются по нормализованному набору фильтров и текущей версии данных.
+# Конвейер загрузки увеличивает версию данных (bump_data_version) после каждой
+# записанной пачки, поэтому старые записи больше не используются.
+# Клиенты получают ETag и при совпадении If-None-Match — 304 без тела.
+#
+# По умолчанию кеш хранится в памяти процесса. Для нескольких воркеров можно
+# подключить общий бэкенд (Redis), задав CACHE_REDIS_URL, или set_backend().
+#
+# Ограничение кеша в памяти: версия данных своя у каждого процесса. Загрузка
+# в одном воркере, пересборки из командной строки (rollup.py, regions.py,
+# partitions.py detach) не сбрасывают кеш других процессов — их ответы
+# обновятся по истечении CACHE_TTL (тайлы — TILE_CACHE_TTL) или после
+# перезапуска. С общим бэкендом (CACHE_REDIS_URL) версию увеличивают и
+# команды пересборки, и кеш сбрасывается сразу во всех воркерах.
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time as _time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))            # секунд
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "1024"))    # записей
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+# --- Бэкенды ---
+
+class MemoryBackend:
+    """LRU-кеш с TTL в памяти процесса."""
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        # Начальная версия уникальна для запуска процесса, чтобы ETag,
+        # выданные до перезапуска, не совпали с новыми
+        self._version = _time.time_ns()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < _time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._data[key] = (_time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_version(self) -> int:
+        return self._version
+
+    def bump_version(self) -> int:
+        with self._lock:
+            self._version += 1
+            # Записи старых версий больше не нужны
+            self._data.clear()
+            return self._version
+
+class RedisBackend:
+    """Общий для всех воркеров кеш в Redis (требуется пакет redis)."""
+
+    VERSION_KEY = "cache:data_version"
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        return self._redis.get(f"cache:{key}")
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._redis.set(f"cache:{key}", value, px=int(ttl * 1000))
+
+    def get_version(self) -> int:
+        return int(self._redis.get(self.VERSION_KEY) or 0)
+
+    def bump_version(self) -> int:
+        # Ключи старых версий истекут по TTL
+        return self._redis.incr(self.VERSION_KEY)
+
+_backend = RedisBackend(CACHE_REDIS_URL) if CACHE_REDIS_URL else MemoryBackend()
+
+def set_backend(backend):
+    """Подключает другой бэкенд кеша (объект с get/set/get_version/bump_version)."""
+    global _backend
+    _backend = backend
+
+def bump_data_version() -> int:
+    """Сбрасывает кеш: вызывается после записи новых данных."""
+    return _backend.bump_version()
+
+# --- Ключи и ответы ---
+
+def normalize_date(value: str | None) -> str | None:
+    """
+    Приводит дату фильтра к каноническому виду ISO (пустая строка → None).
+    Некорректная дата остаётся как есть: её отклоняет сам эндпоинт (400).
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        return value
+
+def cache_key(
+    endpoint: str, uav_type=None, city=None, startDate=None, endDate=None, groupBy=None,
+    extra: dict | None = None,
+) -> str:
+    """
+    Нормализованный ключ: (эндпоинт, uav_type, city, startDate, endDate, groupBy)
+    и, если заданы, дополнительные параметры эндпоинта extra.
+    """
+    key = [
+        endpoint,
+        uav_type or None,
+        city or None,
+        normalize_date(startDate),
+        normalize_date(endDate),
+        groupBy or None,
+    ]
+    if extra:
+        key.append(sorted(extra.items()))
+    return json.dumps(key, ensure_ascii=False, default=str)
+
+def _entry(key: str) -> tuple[str, dict]:
+    """Ключ записи с версией данных и заголовки ответа (ETag по ключу и версии)."""
+    version = _backend.get_version()
+    digest = hashlib.sha1(f"{version}:{key}".encode()).hexdigest()[:20]
+    return f"{version}:{key}", {"ETag": f'W/"{digest}"', "Cache-Control": "no-cache"}
+
+def _encode(body, media_type: str) -> bytes:
+    if media_type == "application/json":
+        return json.dumps(jsonable_encoder(body), ensure_ascii=False).encode()
+    return body
+
+def cached_response(
+    request: Request,
+    key: str,
+    compute: Callable[[], object],
+    media_type: str = "application/json",
+    ttl: float = CACHE_TTL,
+) -> Response:
+    """
+    Возвращает ответ из кеша или вычисляет его через compute().
+    Для application/json compute() возвращает данные для JSON, иначе — готовые bytes.
+    ETag зависит от ключа и версии данных: если клиент прислал тот же
+    If-None-Match, отвечаем 304 без обращения к кешу и базе.
+    """
+    full_key, headers = _entry(key)
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    body = _backend.get(full_key)
+    if body is None:
+        body = _encode(compute(), media_type)
+        _backend.set(full_key, body, ttl)
+
+    return Response(content=body, media_type=media_type, headers=headers)
+
+async def cached_response_async(
+    request: Request,
+    key: str,
+    compute: Callable[[], Awaitable[object]],
+    media_type: str = "application/json",
+    ttl: float = CACHE_TTL,
+) -> Response:
+    """То же, что cached_response, для асинхронной функции compute()."""
+    full_key, headers = _entry(key)
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    body = _backend.get(full_key)
+    if body is None:
+        body = _encode(await compute(), media_type)
+        _backend.set(full_key, body, ttl)
+
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def cached(endpoint: str, params: tuple[str, ...] = ()):
+    """
+    Декоратор эндпоинта (синхронного или async): кеширует JSON-ответ по фильтрам
+    (uav_type, city, startDate, endDate, groupBy), параметрам params и версии данных.
+    Добавляет в сигнатуру параметр request для чтения If-None-Match.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        request_param = inspect.Parameter(
+            "_request", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=Request
+        )
+
+        def key_for(kwargs) -> str:
+            return cache_key(
+                endpoint,
+                kwargs.get("uav_type"),
+                kwargs.get("city"),
+                kwargs.get("startDate"),
+                kwargs.get("endDate"),
+                kwargs.get("groupBy"),
+                extra={name: kwargs.get(name) for name in params},
+            )
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(_request: Request, **kwargs):
+                return await cached_response_async(_request, key_for(kwargs), lambda: func(**kwargs))
+        else:
+            @functools.wraps(func)
+            def wrapper(_request: Request, **kwargs):
+                return cached_response(_request, key_for(kwargs), lambda: func(**kwargs))
+
+        wrapper.__signature__ = signature.replace(
+            parameters=[request_param, *signature.parameters.values()]
+        )
+        return wrapper
+
+    return decorator
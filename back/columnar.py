@@ -0,0 +1,207 @@
+# columnar.py
+# --- Колоночный экспорт и импорт рейсов (Parquet / Arrow) ---
+# Экспорт: рейсы с фильтрами дашборда читаются серверным курсором пачками
+# по EXPORT_BATCH_SIZE строк, каждая пачка — Arrow RecordBatch (для Parquet —
+# row group), ответ отдаётся потоком. Геометрия — WKB (ST_AsBinary в базе).
+#   GET /flights/export.parquet   — Parquet (сжатие zstd)
+#   GET /flights/export.arrow     — Arrow IPC stream
+# Импорт: файл Parquet того же формата загружается тем же конвейером,
+# что и Excel (ingest.py), см. upload.py. sid и row_hash сохраняются,
+# поэтому повторный импорт выгрузки не создаёт дубликатов; строкам без
+# row_hash (рейсы, загруженные до миграции 0004, или сторонний файл) он
+# считается по значениям полей.
+
+import os
+from typing import Callable, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+
+import models
+from crud import flight_filters
+from database import SessionLocal
+from parser import row_hash
+
+router = APIRouter()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+
+# Колонки выгрузки и их типы Arrow
+ARROW_SCHEMA = pa.schema([
+    ("flight_id", pa.int64()),
+    ("sid", pa.string()),
+    ("uav_type", pa.string()),
+    ("reg_number", pa.string()),
+    ("date", pa.date32()),
+    ("dep_time", pa.time64("us")),
+    ("arr_time", pa.time64("us")),
+    ("duration", pa.duration("us")),
+    ("dep_coord", pa.binary()),
+    ("dest_coord", pa.binary()),
+    ("route_coords", pa.binary()),
+    ("min_alt", pa.float64()),
+    ("max_alt", pa.float64()),
+    ("city", pa.string()),
+    ("region_id", pa.int32()),
+    ("row_hash", pa.string()),
+])
+GEO_FIELDS = {"dep_coord", "dest_coord", "route_coords"}
+# Поля, не входящие в хеш строки при импорте: flight_id — ключ базы-источника
+# (не переносится), регион определяется заново
+_UNHASHED_FIELDS = {"flight_id", "region_id", "row_hash"}
+
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# --- Экспорт ---
+
+def export_query(**filters):
+    """SELECT рейсов для выгрузки: колонки ARROW_SCHEMA, геометрия в WKB."""
+    columns = [
+        func.ST_AsBinary(getattr(models.Flight, name)).label(name) if name in GEO_FIELDS
+        else getattr(models.Flight, name)
+        for name in ARROW_SCHEMA.names
+    ]
+    return (
+        select(*columns)
+        .where(*flight_filters(**filters))
+        .order_by(models.Flight.flight_id)
+    )
+
+def iter_record_batches(db, batch_size: int = EXPORT_BATCH_SIZE, **filters) -> Iterator[pa.RecordBatch]:
+    """Рейсы пачками Arrow RecordBatch через серверный курсор."""
+    result = db.execute(export_query(**filters).execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        arrays = []
+        for i, field in enumerate(ARROW_SCHEMA):
+            values = columns[i]
+            if field.name in GEO_FIELDS:
+                values = [bytes(v) if v is not None else None for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=ARROW_SCHEMA)
+
+class _ChunkSink:
+    """Файлоподобный приёмник для писателей pyarrow: накапливает записанные байты."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def _stream_export(open_writer: Callable, **filters) -> Iterator[bytes]:
+    """Пишет пачки рейсов писателем open_writer(sink) и отдаёт байты по мере записи."""
+    sink = _ChunkSink()
+    writer = open_writer(sink)
+    # Отдельная сессия: она должна жить, пока отдаётся ответ
+    db = SessionLocal()
+    try:
+        for batch in iter_record_batches(db, **filters):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    finally:
+        db.close()
+
+def _export_response(open_writer: Callable, media_type: str, filename: str, **filters):
+    return StreamingResponse(
+        _stream_export(open_writer, **filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/flights/export.parquet")
+def export_parquet(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+):
+    """Выгрузка рейсов с фильтрами в Parquet (потоком, row group на пачку)."""
+    return _export_response(
+        lambda sink: pq.ParquetWriter(sink, ARROW_SCHEMA, compression="zstd"),
+        PARQUET_MEDIA_TYPE, "flights.parquet",
+        uav_type=uav_type, city=city, startDate=startDate, endDate=endDate,
+    )
+
+@router.get("/flights/export.arrow")
+def export_arrow(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+):
+    """Выгрузка рейсов с фильтрами в Arrow IPC stream."""
+    return _export_response(
+        lambda sink: pa.ipc.new_stream(sink, ARROW_SCHEMA),
+        ARROW_MEDIA_TYPE, "flights.arrow",
+        uav_type=uav_type, city=city, startDate=startDate, endDate=endDate,
+    )
+
+# --- Импорт ---
+
+def _wkb_to_wkt(values: list) -> list:
+    """WKB → WKT для конвейера загрузки (staging хранит геометрию текстом)."""
+    return shapely.to_wkt(shapely.from_wkb(values), rounding_precision=-1).tolist()
+
+def iter_parquet(
+    source,
+    skip_known: Callable[[list[str]], set[str]] | None = None,
+) -> Iterator[dict]:
+    """
+    Потоково читает Parquet (формат выгрузки export.parquet) по row group и
+    возвращает словари рейсов в формате parse_message (SID — в flight_id).
+    skip_known — как в parser.iter_excel: строки с загруженным row_hash пропускаются.
+    """
+    reader = pq.ParquetFile(source)
+    columns = [name for name in ARROW_SCHEMA.names if name in reader.schema_arrow.names]
+    for batch in reader.iter_batches(columns=columns):
+        data = batch.to_pydict()
+        count = batch.num_rows
+        for name in GEO_FIELDS & data.keys():
+            data[name] = _wkb_to_wkt(data[name])
+
+        # Без row_hash строка без SID дублировалась бы при каждом импорте
+        hashed = [name for name in columns if name not in _UNHASHED_FIELDS]
+        data["row_hash"] = [
+            h if h is not None else row_hash(tuple(data[name][i] for name in hashed))
+            for i, h in enumerate(data.get("row_hash") or [None] * count)
+        ]
+
+        skip = set()
+        if skip_known:
+            skip = skip_known(data["row_hash"])
+
+        for i in range(count):
+            row = {name: data[name][i] for name in columns}
+            row["row_hash"] = data["row_hash"][i]
+            if row.get("row_hash") in skip:
+                continue
+            # Идентификатор flight_id выгрузки не переносится: новый — автоинкремент
+            row["flight_id"] = row.pop("sid", None)
+            yield row
@@ -2,13 +2,14 @@
 # C - Create, R - Read, U - Update, D - Delete
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, cast, case, literal, JSON, Text
+from pydantic import TypeAdapter
 import models
 import schemas
 import math
 from geoalchemy2.shape import to_shape
 from shapely.wkb import dumps
-from datetime import time, timedelta
+from datetime import date, datetime, time, timedelta
 from shapely.geometry import mapping
 
 # --- Функции для работы с данными ---
@@ -84,27 +85,122 @@ def get_region_by_point(db: Session, lon: float, lat: float):
 
 def get_region_by_city(db: Session, city: str):
     """
-    Определяет регион по городу, используя координаты взлета первого рейса в этом городе.
+    Определяет регион по городу: регион точки вылета рейса из этого города
+    (region_id заполняется при загрузке, см. regions.py). Один запрос.
     """
-    flight = db.query(models.Flight).filter(models.Flight.city == city).first()
-    if not flight:
-        return None
+    return (
+        db.query(models.Region)
+        .join(models.Flight, models.Flight.region_id == models.Region.id)
+        .filter(models.Flight.city == city)
+        .first()
+    )
 
-    # Получаем координаты взлета
-    dep_coord = db.scalar(func.ST_AsText(flight.dep_coord))
-    lon, lat = dep_coord.replace("POINT(", "").replace(")", "").split()
+# --- Получение рейсов ---
 
-    return get_region_by_point(db, float(lon), float(lat))
+# Поля рейса в ответе (порядок как в schemas.FlightResponse)
+FLIGHT_FIELDS = [
+    "flight_id", "uav_type", "reg_number", "date", "dep_time", "arr_time", "duration",
+    "dep_coord", "dest_coord", "route_coords", "min_alt", "max_alt", "city",
+]
+GEO_FIELDS = {"dep_coord", "dest_coord", "route_coords"}
 
-# --- Получение рейсов ---
+_timedelta_adapter = TypeAdapter(timedelta)
+
+def parse_fields(fields: str | None) -> list[str]:
+    """
+    Разбирает проекцию fields="a,b,c" в список полей.
+    flight_id включается всегда (нужен для курсора). Неизвестное поле → ValueError.
+    """
+    if not fields:
+        return FLIGHT_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(FLIGHT_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return [f for f in FLIGHT_FIELDS if f == "flight_id" or f in requested]
+
+def filter_conditions(
+    model, uav_type: str = None, city: str = None, startDate: str = None, endDate: str = None,
+) -> list:
+    """
+    Условия WHERE для фильтров дашборда (тип БПЛА, город, период) по таблице
+    model со столбцами uav_type, city и date: flights или суточной сводки.
+    """
+    conditions = []
+    if uav_type:
+        conditions.append(model.uav_type == uav_type)
+    if city:
+        conditions.append(model.city == city)
+    # Сравнение date с date (не с timestamp): по таким условиям работают индексы
+    # по date и планировщик отсекает секции flights
+    if startDate:
+        conditions.append(model.date >= datetime.fromisoformat(startDate).date())
+    if endDate:
+        conditions.append(model.date <= datetime.fromisoformat(endDate).date())
+    return conditions
+
+def flight_filters(uav_type: str = None, city: str = None, startDate: str = None, endDate: str = None) -> list:
+    """Условия WHERE для фильтров дашборда по таблице flights."""
+    return filter_conditions(models.Flight, uav_type, city, startDate, endDate)
 
-def get_flights(db: Session, skip: int = 0, limit: int = 100):
+def flights_query(
+    uav_type: str = None,
+    city: str = None,
+    startDate: str = None,
+    endDate: str = None,
+    after: int = None,
+    fields: list[str] = FLIGHT_FIELDS,
+    conditions: list = (),
+):
     """
-    Возвращает список рейсов с возможностью пагинации.
-    Результат конвертируется в формат, подходящий для Pydantic.
+    Строит SELECT рейсов с фильтрами и keyset-пагинацией по flight_id.
+    Геометрия переводится в WKT в базе (ST_AsText) и выбирается только если запрошена.
+    conditions — дополнительные условия WHERE (например, пространственные).
     """
-    flights = db.query(models.Flight).offset(skip).limit(limit).all()
-    return [convert_flight_for_response(f) for f in flights]
+    columns = [
+        func.ST_AsText(getattr(models.Flight, f)).label(f) if f in GEO_FIELDS
+        else getattr(models.Flight, f)
+        for f in fields
+    ]
+    query = select(*columns).where(*flight_filters(uav_type, city, startDate, endDate), *conditions)
+
+    if after is not None:
+        query = query.where(models.Flight.flight_id > after)
+
+    return query.order_by(models.Flight.flight_id)
+
+def serialize_flight_row(row) -> dict:
+    """
+    Приводит строку выборки к JSON-совместимому словарю в том же формате,
+    что и FlightResponse (даты/время — ISO 8601, duration — ISO 8601 duration).
+    """
+    result = {}
+    for key, value in row.items():
+        if isinstance(value, timedelta):
+            value = _timedelta_adapter.dump_python(value, mode="json")
+        elif isinstance(value, (date, time)):
+            value = value.isoformat()
+        result[key] = value
+    return result
+
+def get_flights(db: Session, limit: int = 100, **filters) -> list[dict]:
+    """
+    Возвращает страницу рейсов (не более limit) после курсора after.
+    Фильтры и проекция — как в flights_query.
+    """
+    rows = db.execute(flights_query(**filters).limit(limit)).mappings()
+    return [serialize_flight_row(row) for row in rows]
+
+def iter_flights(db: Session, batch_size: int = 1000, **filters):
+    """
+    Потоково возвращает рейсы через серверный курсор (по batch_size строк),
+    не загружая всю выборку в память.
+    """
+    result = db.execute(
+        flights_query(**filters).execution_options(yield_per=batch_size)
+    ).mappings()
+    for row in result:
+        yield serialize_flight_row(row)
 
 # --- Конвертация рейса в GeoJSON для фронтенда и Leaflet ---
 
@@ -155,3 +251,66 @@ def flight_to_geojson(flight):
         })
 
     return features
+
+# --- GeoJSON слоев карты, собранный в PostGIS ---
+
+def _geojson_feature(column, geom, properties: dict):
+    """
+    Feature в виде текста JSON, собранного в базе (ST_AsGeoJSON + json_build_object).
+    geom — выражение геометрии столбца column; для рейсов без геометрии — NULL.
+    """
+    props = []
+    for key, value in properties.items():
+        props += [literal(key), value]
+    feature = func.json_build_object(
+        "type", "Feature",
+        "geometry", cast(func.ST_AsGeoJSON(geom), JSON),
+        "properties", func.json_build_object(*props),
+    )
+    return case((column.isnot(None), cast(feature, Text)), else_=None)
+
+def geojson_query(tolerance: float = None, **filters):
+    """
+    SELECT трёх Feature на рейс (вылет, посадка, маршрут) в формате flight_to_geojson.
+    tolerance (в градусах) — точки привязываются к сетке ST_SnapToGrid,
+    маршруты упрощаются ST_Simplify (вырожденные линии сохраняются).
+    """
+    flight = models.Flight
+    dep, dest, route = flight.dep_coord, flight.dest_coord, flight.route_coords
+    if tolerance:
+        dep = func.ST_SnapToGrid(func.geometry(dep), tolerance)
+        dest = func.ST_SnapToGrid(func.geometry(dest), tolerance)
+        route = func.ST_Simplify(func.geometry(route), tolerance, True)
+
+    return (
+        select(
+            _geojson_feature(flight.dep_coord, dep, {
+                "flight_id": flight.flight_id, "city": flight.city, "point_type": literal("departure"),
+            }),
+            _geojson_feature(flight.dest_coord, dest, {
+                "flight_id": flight.flight_id, "point_type": literal("destination"),
+            }),
+            _geojson_feature(flight.route_coords, route, {
+                "flight_id": flight.flight_id, "type": literal("route"),
+            }),
+        )
+        .where(*flight_filters(**filters))
+        .order_by(flight.flight_id)
+    )
+
+def iter_geojson(db: Session, tolerance: float = None, batch_size: int = 2000, **filters):
+    """
+    Потоково отдаёт FeatureCollection текстом: Feature собираются в PostGIS
+    и читаются серверным курсором пачками, без создания Python-объектов на точку.
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    result = db.execute(
+        geojson_query(tolerance, **filters).execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        features = [f for row in rows for f in row if f is not None]
+        if features:
+            yield separator + ",".join(features)
+            separator = ","
+    yield "]}"
@@ -0,0 +1,234 @@
+# cube.py
+# --- Агрегация рейсов по произвольным разрезам ---
+# Один GROUP BY по любому набору измерений и мер с общими фильтрами дашборда:
+#     GET /flights/cube?dimensions=city,month&measures=count,avg_duration&top=10
+# Измерения: city, uav_type, region, month (YYYY-MM), weekday (1 — пн … 7 — вс),
+#            hour (час dep_time)
+# Меры:      count, total_duration и avg_duration (секунды), min_alt, max_alt
+#
+# Запрос считается по суточной сводке flight_daily_stats, если она его покрывает
+# (меры count и длительности, измерения без hour), иначе — по flights.
+# С top=N возвращаются N групп с наибольшим значением меры sort и, при other,
+# группа "остальные" (other: true, измерения null) — в том же запросе:
+# группы нумеруются row_number() и сворачиваются по least(номер, N + 1).
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import DateTime, Integer, cast, extract, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import cached
+from crud import filter_conditions
+from database import get_async_db
+from models import Flight, FlightDailyStats, Region
+
+router = APIRouter()
+
+def month_start(t):
+    """
+    Начало месяца — выражение индекса ix_flights_month (миграции 0002, 0005).
+    'month' подставляется литералом: с параметром ($n в asyncpg) планировщик
+    не сопоставил бы выражение с индексом.
+    """
+    return func.date_trunc(literal_column("'month'"), cast(t.date, DateTime))
+
+# Измерение → выражение по таблице (flights или сводке)
+DIMENSIONS = {
+    "city": lambda t: t.city,
+    "uav_type": lambda t: t.uav_type,
+    "region": lambda t: Region.nl_name_1,
+    "month": lambda t: func.to_char(month_start(t), 'YYYY-MM'),
+    "weekday": lambda t: cast(extract('isodow', t.date), Integer),
+    "hour": lambda t: cast(extract('hour', t.dep_time), Integer),
+}
+
+# Мера → частичные агрегаты, из которых она считается. Частичные агрегаты
+# складываются при сворачивании групп в "остальные", сами меры (среднее) — нет
+PARTIALS = {
+    "count": ("count",),
+    "total_duration": ("duration_sum",),
+    "avg_duration": ("duration_sum", "duration_n"),
+    "min_alt": ("min_alt",),
+    "max_alt": ("max_alt",),
+}
+MEASURES = list(PARTIALS)
+
+# Частичные агрегаты по flights и их свёртка
+_FLIGHT_PARTIALS = {
+    "count": lambda: func.count(),
+    "duration_sum": lambda: extract('epoch', func.sum(Flight.duration)),
+    "duration_n": lambda: func.count(Flight.duration),
+    "min_alt": lambda: func.min(Flight.min_alt),
+    "max_alt": lambda: func.max(Flight.max_alt),
+}
+_COMBINE = {
+    "count": func.sum,
+    "duration_sum": func.sum,
+    "duration_n": func.sum,
+    "min_alt": func.min,
+    "max_alt": func.max,
+}
+
+# Частичные агрегаты по суточной сводке
+_ROLLUP_PARTIALS = {
+    "count": lambda: func.sum(FlightDailyStats.flights),
+    "duration_sum": lambda: func.sum(FlightDailyStats.duration_seconds),
+    "duration_n": lambda: func.sum(FlightDailyStats.duration_flights),
+}
+
+# Измерение → выражение группировки, если оно отличается от выводимого:
+# регион — по id, месяц — по индексируемому началу месяца
+GROUP_KEYS = {
+    "region": lambda t: Region.id,
+    "month": month_start,
+}
+
+# Что покрывает суточная сводка
+ROLLUP_DIMENSIONS = {"city", "uav_type", "region", "month", "weekday"}
+ROLLUP_MEASURES = {"count", "total_duration", "avg_duration"}
+
+def parse_list(value: str | None, allowed: list[str], default: list[str], name: str) -> list[str]:
+    """Разбирает список через запятую; неизвестное значение → ValueError."""
+    if not value:
+        return default
+    items = list(dict.fromkeys(v.strip() for v in value.split(",") if v.strip()))
+    unknown = [v for v in items if v not in allowed]
+    if unknown:
+        raise ValueError(f"Неизвестные {name}: {', '.join(unknown)}; допустимы: {', '.join(allowed)}")
+    return items
+
+def uses_rollup(dimensions: list[str], measures: list[str]) -> bool:
+    return set(dimensions) <= ROLLUP_DIMENSIONS and set(measures) <= ROLLUP_MEASURES
+
+def _measure_sql(measure: str, partials: dict):
+    """Значение меры по частичным агрегатам (для сортировки в SQL)."""
+    if measure == "avg_duration":
+        return partials["duration_sum"] / func.nullif(partials["duration_n"], 0)
+    return partials[PARTIALS[measure][0]]
+
+def _measure_value(measure: str, row):
+    """Значение меры по частичным агрегатам строки результата."""
+    if measure == "count":
+        return int(row.count or 0)
+    if measure == "avg_duration":
+        return float(row.duration_sum) / int(row.duration_n) if row.duration_n else None
+    value = getattr(row, PARTIALS[measure][0])
+    return float(value) if value is not None else None
+
+def cube_query(
+    dimensions: list[str],
+    measures: list[str],
+    top: int | None = None,
+    sort: str | None = None,
+    other: bool = True,
+    conditions: list = (),
+    **filters,
+):
+    """
+    SELECT агрегации: столбцы измерений (по именам), частичные агрегаты мер и,
+    при top, bucket — номер группы (top + 1 — "остальные").
+    conditions — дополнительные условия по flights (сводка тогда не используется).
+    """
+    rollup = not conditions and uses_rollup(dimensions, measures)
+    table = FlightDailyStats if rollup else Flight
+
+    # Одни и те же объекты выражений в SELECT, GROUP BY и ORDER BY (asyncpg
+    # нумерует параметры: разные объекты дали бы разные $n)
+    dims = {d: DIMENSIONS[d](table) for d in dimensions}
+    group_by = [GROUP_KEYS[d](table) if d in GROUP_KEYS else expr for d, expr in dims.items()]
+    group_by += [dims["region"]] if "region" in dims else []
+
+    needed = list(dict.fromkeys(p for m in measures for p in PARTIALS[m]))
+    available = _ROLLUP_PARTIALS if rollup else _FLIGHT_PARTIALS
+    partials = {p: available[p]() for p in needed}
+
+    query = select(
+        *[expr.label(d) for d, expr in dims.items()],
+        *[expr.label(p) for p, expr in partials.items()],
+    ).select_from(table)
+    if "region" in dims:
+        query = query.outerjoin(Region, Region.id == table.region_id)
+    query = query.where(*filter_conditions(table, **filters), *conditions)
+    if group_by:
+        query = query.group_by(*group_by)
+
+    if top is None or not dims:
+        return query.order_by(*[expr.asc().nulls_last() for expr in dims.values()])
+
+    # Топ-N: номер группы по убыванию меры sort, затем свёртка хвоста
+    rank = func.row_number().over(order_by=[
+        _measure_sql(sort or measures[0], partials).desc().nulls_last(),
+        *[expr.asc().nulls_last() for expr in dims.values()],
+    ])
+    ranked = query.add_columns(rank.label("rank")).subquery("ranked")
+    if not other:
+        return (
+            select(*[ranked.c[d] for d in dims], *[ranked.c[p] for p in partials], ranked.c.rank.label("bucket"))
+            .where(ranked.c.rank <= top)
+            .order_by(ranked.c.rank)
+        )
+    bucket = func.least(ranked.c.rank, top + 1)
+    return (
+        select(
+            # В группах топа одна строка: min() возвращает её значение
+            *[func.min(ranked.c[d]).label(d) for d in dims],
+            *[_COMBINE[p](ranked.c[p]).label(p) for p in partials],
+            bucket.label("bucket"),
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+async def aggregate(
+    db: AsyncSession,
+    dimensions: list[str],
+    measures: list[str],
+    top: int | None = None,
+    sort: str | None = None,
+    other: bool = True,
+    conditions: list = (),
+    **filters,
+) -> list[dict]:
+    """Строки агрегации: значения измерений и мер (группа "остальные" — other: true)."""
+    query = cube_query(dimensions, measures, top=top, sort=sort, other=other, conditions=conditions, **filters)
+    rows = []
+    for r in (await db.execute(query)).all():
+        is_other = top is not None and dimensions and r.bucket > top
+        row = {d: None if is_other else getattr(r, d) for d in dimensions}
+        row.update({m: _measure_value(m, r) for m in measures})
+        if is_other:
+            row["other"] = True
+        rows.append(row)
+    return rows
+
+@router.get("/flights/cube")
+@cached("cube", params=("dimensions", "measures", "top", "sort", "other"))
+async def get_cube(
+    dimensions: str | None = Query(None, description=f"Измерения через запятую: {', '.join(DIMENSIONS)}"),
+    measures: str | None = Query(None, description=f"Меры через запятую: {', '.join(MEASURES)}"),
+    top: int | None = Query(None, ge=1, le=1000, description="Только N групп с наибольшим значением sort"),
+    sort: str | None = Query(None, description="Мера для топа (по умолчанию первая из measures)"),
+    other: bool = Query(True, description="При top — добавить группу остальных"),
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает агрегаты рейсов по выбранным измерениям с фильтрами дашборда:
+    source — таблица, по которой посчитан ответ (rollup | flights), rows — группы.
+    """
+    try:
+        dims = parse_list(dimensions, list(DIMENSIONS), [], "измерения")
+        meas = parse_list(measures, MEASURES, ["count"], "меры")
+        if sort is not None and sort not in meas:
+            raise ValueError(f"sort должна быть одной из мер: {', '.join(meas)}")
+        filters = dict(uav_type=uav_type, city=city, startDate=startDate, endDate=endDate)
+        filter_conditions(Flight, **filters)  # проверка формата дат
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "source": "rollup" if uses_rollup(dims, meas) else "flights",
+        "rows": await aggregate(db, dims, meas, top=top, sort=sort, other=other, **filters),
+    }
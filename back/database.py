@@ -1,11 +1,219 @@
-from sqlalchemy import create_engine
+# database.py
+# --- Подключение к базе и общий пул соединений ---
+# Все пути работы с базой используют пулы, настроенные здесь:
+# - engine: ORM-сессии (get_db) и «сырые» соединения psycopg2 для пакетной
+#   загрузки, миграций и пересборки сводок (raw_connection);
+# - async_engine: асинхронные эндпоинты чтения (asyncpg).
+# Настройки пулов — переменные окружения:
+#   DATABASE_URL             строка подключения (postgresql://...)
+#   DB_POOL_SIZE             постоянных соединений в пуле (по умолчанию 5)
+#   DB_MAX_OVERFLOW          дополнительных соединений сверх пула (10)
+#   DB_POOL_TIMEOUT          ожидание свободного соединения, сек (30)
+#   DB_POOL_RECYCLE          пересоздание соединения старше, сек (1800)
+#   DB_POOL_PRE_PING         проверка соединения перед выдачей (1)
+#   DB_STATEMENT_TIMEOUT     statement_timeout соединений, мс (0 — без ограничения)
+#   DB_BULK_STATEMENT_TIMEOUT  statement_timeout для загрузки и обслуживания, мс (0)
+# Метрики пулов (выдано, ожидают, время подключения) — pool_stats().
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:root@db:5432/dashboard")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "no")
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+DB_BULK_STATEMENT_TIMEOUT = int(os.getenv("DB_BULK_STATEMENT_TIMEOUT", "0"))
+
+# --- Метрики пула ---
+
+class PoolMetrics:
+    """Счётчики пула: ожидающие соединения, время ожидания и подключения."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+
+    def wait_started(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def wait_finished(self, seconds: float, ok: bool):
+        with self._lock:
+            self.waiting -= 1
+            if ok:
+                self.checkouts += 1
+                self.wait_seconds += seconds
+                self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            else:
+                self.timeouts += 1
+
+    def connected(self, seconds: float):
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += seconds
+            self.max_connect_seconds = max(self.max_connect_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "avg_wait_ms": round(1000 * self.wait_seconds / self.checkouts, 3) if self.checkouts else None,
+                "max_wait_ms": round(1000 * self.max_wait_seconds, 3),
+                "connects": self.connects,
+                "avg_connect_ms": round(1000 * self.connect_seconds / self.connects, 3) if self.connects else None,
+                "max_connect_ms": round(1000 * self.max_connect_seconds, 3),
+            }
+
+def _metered(pool_class):
+    """
+    Класс пула, который учитывает ожидание свободного соединения.
+    Метрики хранятся в классе: они сохраняются при пересоздании пула (dispose).
+    """
 
-SQLALCHEMY_DATABASE_URL = "postgresql://postgres:root@db:5432/dashboard"
+    class MeteredPool(pool_class):
+        metrics = PoolMetrics()
 
+        def _do_get(self):
+            self.metrics.wait_started()
+            started = time.perf_counter()
+            ok = False
+            try:
+                connection = super()._do_get()
+                ok = True
+                return connection
+            finally:
+                self.metrics.wait_finished(time.perf_counter() - started, ok)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    MeteredPool.__name__ = f"Metered{pool_class.__name__}"
+    return MeteredPool
+
+def _instrument(sync_engine):
+    """Подключает метрики к пулу движка и замеряет время установки соединений."""
+    metrics = sync_engine.pool.metrics
+
+    @event.listens_for(sync_engine, "do_connect")
+    def _timed_connect(dialect, conn_rec, cargs, cparams):
+        started = time.perf_counter()
+        connection = dialect.connect(*cargs, **cparams)
+        metrics.connected(time.perf_counter() - started)
+        return connection
+
+_POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# --- Движки ---
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=_metered(QueuePool),
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"},
+    **_POOL_OPTIONS,
+)
+_instrument(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+# Асинхронный движок (asyncpg) для эндпоинтов чтения: запросы не блокируют event loop
+async_engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1),
+    poolclass=_metered(AsyncAdaptedQueuePool),
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}},
+    **_POOL_OPTIONS,
+)
+_instrument(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+Base = declarative_base()
+
+def pool_stats() -> dict:
+    """Состояние и метрики пулов соединений (для подбора размера под число воркеров)."""
+    stats = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        stats[name] = {
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            **pool.metrics.snapshot(),
+        }
+    return stats
+
+# --- Соединение psycopg2 из общего пула ---
+@contextmanager
+def raw_connection(statement_timeout: int = DB_BULK_STATEMENT_TIMEOUT):
+    """
+    Выдаёт DBAPI-соединение (psycopg2) из пула engine для COPY и длинных
+    операций. statement_timeout (мс) действует на время использования,
+    затем восстанавливается; при ошибке транзакция откатывается.
+    """
+    override = statement_timeout != DB_STATEMENT_TIMEOUT
+    conn = engine.raw_connection()
+    try:
+        if override:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (statement_timeout,))
+            conn.commit()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if override:
+                _reset_statement_timeout(conn)
+    finally:
+        conn.close()
+
+def _reset_statement_timeout(conn):
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("RESET statement_timeout")
+        conn.commit()
+    except Exception:
+        # Соединение в неизвестном состоянии не возвращается в пул
+        conn.invalidate()
+
+# --- Dependency: сессия базы данных ---
+def get_db():
+    """Создаёт сессию к БД и гарантирует её закрытие после использования."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """Асинхронная сессия к БД для эндпоинтов чтения."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,139 @@
+# distributions.py
+# --- Налёт и распределения длительности и высоты ---
+#     GET /flights/distribution?groupBy=city&percentiles=50,90,99
+# По группам (city, uav_type, region, month, weekday или без группировки):
+# количество рейсов, налёт в часах, средняя длительность, перцентили
+# длительности и распределение по диапазонам высоты max_alt.
+#
+# Считается по суточной сводке: гистограммы строк сводки, попавших под
+# фильтры, складываются в базе (агрегат hist_sum, миграция 0006), перцентили —
+# линейной интерполяцией внутри интервала гистограммы. Точность перцентиля —
+# ширина интервала rollup.DURATION_EDGES, в котором он лежит.
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import ARRAY, Integer, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import cached
+from crud import filter_conditions
+from cube import DIMENSIONS, ROLLUP_DIMENSIONS
+from database import get_async_db
+from models import FlightDailyStats, Region
+from rollup import ALTITUDE_EDGES, DURATION_EDGES
+
+router = APIRouter()
+
+DEFAULT_PERCENTILES = [50, 90, 95, 99]
+
+def histogram_quantile(counts: list[int], edges: list[float], q: float) -> float | None:
+    """
+    Квантиль q (0..1) по гистограмме с границами edges (интервалы width_bucket).
+    Внутри интервала значения считаются равномерно распределёнными; для
+    открытого последнего интервала возвращается его нижняя граница.
+    """
+    total = sum(counts)
+    if total <= 0:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count > 0 and seen + count >= rank:
+            low = edges[i - 1] if i > 0 else 0
+            if i >= len(edges):
+                return float(low)
+            return low + (edges[i] - low) * (rank - seen) / count
+        seen += count
+    return float(edges[-1])
+
+def _bands(counts: list[int], edges: list[float]) -> list[dict]:
+    """Интервалы гистограммы: [{from, to, flights}], to = None у последнего."""
+    bounds = [0, *edges, None]
+    return [
+        {"from": bounds[i], "to": bounds[i + 1], "flights": counts[i] if i < len(counts) else 0}
+        for i in range(len(edges) + 1)
+    ]
+
+def _parse_percentiles(value: str | None) -> list[float]:
+    if not value:
+        return DEFAULT_PERCENTILES
+    try:
+        result = [float(p) for p in value.split(",") if p.strip()]
+    except ValueError:
+        raise ValueError("percentiles — числа через запятую, например 50,90,99")
+    if any(not 0 <= p <= 100 for p in result):
+        raise ValueError("percentiles должны быть в диапазоне 0..100")
+    return result
+
+def distribution_query(group_by: str | None = None, **filters):
+    stats = FlightDailyStats
+    histogram = ARRAY(Integer)
+    columns = [
+        func.sum(stats.flights).label("flights"),
+        func.sum(stats.duration_seconds).label("duration_seconds"),
+        func.sum(stats.duration_flights).label("duration_flights"),
+        func.hist_sum(stats.duration_hist, type_=histogram).label("duration_hist"),
+        func.hist_sum(stats.alt_hist, type_=histogram).label("alt_hist"),
+    ]
+    if group_by is None:
+        return select(*columns).where(*filter_conditions(stats, **filters))
+
+    # Один объект выражения в SELECT, GROUP BY и ORDER BY (параметры asyncpg)
+    dim = DIMENSIONS[group_by](stats)
+    query = select(dim.label("name"), *columns).select_from(stats)
+    if group_by == "region":
+        query = query.outerjoin(Region, Region.id == stats.region_id)
+        group = [Region.id, dim]
+    else:
+        group = [dim]
+    return (
+        query.where(*filter_conditions(stats, **filters))
+        .group_by(*group)
+        .order_by(dim.asc().nulls_last())
+    )
+
+def _group(row, percentiles: list[float]) -> dict:
+    duration_hist = row.duration_hist or []
+    alt_hist = row.alt_hist or []
+    duration_flights = int(row.duration_flights or 0)
+    return {
+        "flights": int(row.flights or 0),
+        "flight_hours": round(float(row.duration_seconds or 0) / 3600, 2),
+        "avg_duration_min": (
+            round(float(row.duration_seconds) / duration_flights / 60, 2) if duration_flights else None
+        ),
+        "duration_percentiles_min": {
+            f"p{p:g}": histogram_quantile(duration_hist, DURATION_EDGES, p / 100) for p in percentiles
+        },
+        "duration_hist": _bands(duration_hist, DURATION_EDGES),
+        "altitude_bands": _bands(alt_hist, ALTITUDE_EDGES),
+    }
+
+@router.get("/flights/distribution")
+@cached("distribution", params=("percentiles",))
+async def get_distribution(
+    groupBy: str | None = Query(None, description=f"Группировка: {', '.join(sorted(ROLLUP_DIMENSIONS))}"),
+    percentiles: str | None = Query(None, description="Перцентили длительности через запятую (0..100)"),
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает налёт (часы), среднюю длительность и перцентили длительности
+    (минуты), гистограмму длительности и диапазоны высоты max_alt — всего или
+    по группам groupBy, с фильтрами дашборда.
+    """
+    try:
+        if groupBy is not None and groupBy not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"groupBy: одно из {', '.join(sorted(ROLLUP_DIMENSIONS))}")
+        points = _parse_percentiles(percentiles)
+        filters = dict(uav_type=uav_type, city=city, startDate=startDate, endDate=endDate)
+        query = distribution_query(groupBy, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = (await db.execute(query)).all()
+    if groupBy is None:
+        return _group(rows[0], points)
+    return [{"name": r.name, **_group(r, points)} for r in rows]
@@ -0,0 +1,37 @@
+# hll.py
+# --- Оценка числа уникальных бортов по скетчам HyperLogLog ---
+# Скетчи строятся в базе при обновлении суточной сводки (агрегат hll_agg,
+# миграция 0007): aircraft_hll — байтовые регистры, по одному на ячейку
+# младших бит хеша reg_number. Объединение скетчей за период и группу —
+# поэлементный максимум регистров, считается в базе (агрегат hll_union_agg,
+# миграция 0010). Здесь — оценка по объединённому скетчу: формула HyperLogLog
+# с поправкой linear counting для малых множеств. Стандартная ошибка — 1.04 / sqrt(m).
+
+import math
+
+import numpy as np
+
+def registers(sketch: bytes | None) -> np.ndarray | None:
+    """Регистры скетча; пустой скетч → None."""
+    if not sketch:
+        return None
+    return np.frombuffer(sketch, dtype=np.uint8)
+
+def estimate(registers: np.ndarray | None) -> int:
+    """Оценка числа уникальных значений по регистрам объединённого скетча."""
+    if registers is None:
+        return 0
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+    zeros = int(np.count_nonzero(registers == 0))
+    # Малые множества: linear counting по числу пустых регистров
+    if raw <= 2.5 * m and zeros:
+        raw = m * math.log(m / zeros)
+    return round(raw)
+
+def relative_error(registers: np.ndarray | None) -> float | None:
+    """Стандартная относительная ошибка оценки для скетча из m регистров."""
+    if registers is None:
+        return None
+    return round(1.04 / math.sqrt(len(registers)), 4)
@@ -0,0 +1,293 @@
+# ingest.py
+# --- Единый конвейер загрузки рейсов в PostGIS ---
+# Строки пачками копируются (COPY) во временную staging-таблицу,
+# регион точки вылета определяется одним пространственным UPDATE (regions.py)
+# или индексом в памяти процесса (region_index.py, REGION_LOOKUP=memory),
+# затем строки переносятся в flights одним INSERT ... SELECT с ST_GeogFromText,
+# а суточная сводка (rollup.py) обновляется из той же пачки.
+# Коммит выполняется один раз на пачку; после коммита сбрасывается кеш
+# ответов статистики (cache.py).
+#
+# Помесячные секции flights для дат пачки создаются перед её транзакцией,
+# отдельной короткой транзакцией (partitions.py).
+# Посчитанные дни flight_daily_occupancy для дат пачки удаляются (occupancy.py).
+#
+# Повторная загрузка идемпотентна (миграция 0004):
+# - рейс с тем же естественным ключом (sid, date, reg_number) перезаписывается
+#   (ON CONFLICT DO UPDATE), его прежний вклад вычитается из сводки;
+# - строка без SID с уже загруженным хешем row_hash пропускается; row_hash
+#   есть у строк и Excel, и Parquet (columnar.py считает его, если в файле его нет);
+# - уже загруженные строки листа отсеиваются до парсинга (known_row_hashes),
+#   уже загруженный файл целиком — по хешу файла (ingested_files).
+
+import hashlib
+import math
+import time as _time
+from datetime import date, timedelta
+from io import StringIO
+from typing import Callable, Iterable, Iterator
+
+from sqlalchemy import text
+
+from database import engine, raw_connection
+from rollup import ROLLUP_SOURCE_COLUMNS, retract_rollup, rollup_upsert_sql
+from regions import assign_staging_regions
+from partitions import ensure_partitions
+from occupancy import invalidate_days
+from region_index import REGION_LOOKUP, tag_regions
+from cache import bump_data_version
+from metrics import record_ingest
+
+# Колонки models.Flight, заполняемые при загрузке (flight_id — автоинкремент)
+FLIGHT_COLUMNS = [
+    "uav_type", "reg_number", "date", "dep_time", "arr_time", "duration",
+    "dep_coord", "dest_coord", "min_alt", "max_alt", "route_coords", "city",
+    "sid", "row_hash",
+]
+GEO_COLUMNS = {"dep_coord", "dest_coord", "route_coords"}
+# Колонки staging-таблицы: region_id заполняется при REGION_LOOKUP=memory,
+# иначе определяется в PostGIS после COPY
+STAGING_COLUMNS = FLIGHT_COLUMNS + ["region_id"]
+# Ключи словаря рейса (parse_message), отличающиеся от имён колонок
+_ROW_KEYS = {"sid": "flight_id"}
+
+DEFAULT_BATCH_SIZE = 5000
+
+STAGING_TABLE = "flights_staging"
+
+CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    uav_type     text,
+    reg_number   text,
+    date         date,
+    dep_time     time,
+    arr_time     time,
+    duration     interval,
+    dep_coord    text,
+    dest_coord   text,
+    min_alt      double precision,
+    max_alt      double precision,
+    route_coords text,
+    city         text,
+    sid          text,
+    row_hash     text,
+    region_id    integer
+) ON COMMIT DELETE ROWS
+"""
+
+_NATURAL_KEY_MATCH = """{a}.sid = {b}.sid
+    AND {a}.date IS NOT DISTINCT FROM {b}.date
+    AND {a}.reg_number IS NOT DISTINCT FROM {b}.reg_number"""
+
+# Повторы внутри пачки: остаётся последняя строка с тем же ключом или хешем
+DEDUP_STAGING_SQL = [
+    f"""
+    DELETE FROM {STAGING_TABLE} AS a USING {STAGING_TABLE} AS b
+    WHERE {_NATURAL_KEY_MATCH.format(a="a", b="b")} AND a.ctid < b.ctid
+    """,
+    f"""
+    DELETE FROM {STAGING_TABLE} AS a USING {STAGING_TABLE} AS b
+    WHERE a.row_hash = b.row_hash AND a.ctid < b.ctid
+    """,
+]
+
+# Рейсы flights, которые пачка перезапишет (для вычитания из сводки)
+REPLACED_SOURCE = f"""(
+    SELECT {", ".join(f"f.{c}" for c in ROLLUP_SOURCE_COLUMNS)}
+    FROM flights AS f
+    JOIN {STAGING_TABLE} AS s ON {_NATURAL_KEY_MATCH.format(a="f", b="s")}
+    WHERE s.sid IS NOT NULL AND f.sid IS NOT NULL
+) AS replaced"""
+
+_INSERT_COLUMNS = f"{', '.join(FLIGHT_COLUMNS)}, region_id"
+_SELECT_COLUMNS = ", ".join(
+    f"ST_GeogFromText({c})" if c in GEO_COLUMNS else c for c in FLIGHT_COLUMNS
+) + ", region_id"
+_RETURNING = f"RETURNING {', '.join(ROLLUP_SOURCE_COLUMNS)}"
+
+# Вставка пачки в flights с перезаписью по естественному ключу и обновлением
+# сводки одним запросом; возвращает число записанных рейсов
+UPSERT_FROM_STAGING_SQL = f"""
+WITH with_sid AS (
+    INSERT INTO flights ({_INSERT_COLUMNS})
+    SELECT {_SELECT_COLUMNS} FROM {STAGING_TABLE} WHERE sid IS NOT NULL
+    ON CONFLICT (sid, date, reg_number) WHERE sid IS NOT NULL
+    DO UPDATE SET {", ".join(f"{c} = EXCLUDED.{c}" for c in FLIGHT_COLUMNS + ["region_id"])}
+    {_RETURNING}
+), without_sid AS (
+    INSERT INTO flights ({_INSERT_COLUMNS})
+    SELECT {_SELECT_COLUMNS} FROM {STAGING_TABLE} WHERE sid IS NULL
+    ON CONFLICT (row_hash, date) WHERE row_hash IS NOT NULL DO NOTHING
+    {_RETURNING}
+), upserted AS (
+    SELECT * FROM with_sid UNION ALL SELECT * FROM without_sid
+), rolled_up AS (
+{rollup_upsert_sql("upserted")}
+)
+SELECT count(*) FROM upserted
+"""
+
+# --- Сериализация значений в текстовый формат COPY ---
+
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+def _copy_value(value) -> str:
+    """
+    Приводит значение к текстовому представлению COPY:
+    - None, NaN, NaT и пустые строки → \\N
+    - timedelta → количество секунд (интервал PostgreSQL)
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, float) and math.isnan(value):
+        return "\\N"
+    if isinstance(value, timedelta):
+        return f"{value.total_seconds()} seconds"
+    if isinstance(value, str):
+        if value.strip() == "":
+            return "\\N"
+        return value.translate(_COPY_ESCAPES)
+    # pandas.NaT и прочие "пустые" значения, не равные самим себе
+    if value != value:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+def _copy_line(row: dict) -> str:
+    return "\t".join(_copy_value(row.get(_ROW_KEYS.get(c, c))) for c in STAGING_COLUMNS) + "\n"
+
+# --- Загрузка ---
+
+def _flush(cur, batch: list[dict]) -> int:
+    """
+    Копирует пачку в staging, определяет регионы точек вылета,
+    вычитает из суточной сводки (flight_daily_stats) перезаписываемые рейсы,
+    записывает пачку в flights, добавляет её к сводке и сбрасывает
+    посчитанную загрузку пространства (occupancy.py) за дни пачки.
+    Возвращает число записанных рейсов.
+    """
+    if REGION_LOOKUP == "memory":
+        # Регионы по индексу в памяти процесса, без пространственного запроса
+        tag_regions(batch)
+
+    buffer = StringIO()
+    buffer.writelines(_copy_line(row) for row in batch)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+        buffer,
+    )
+    if REGION_LOOKUP != "memory":
+        assign_staging_regions(cur, STAGING_TABLE)
+    for sql in DEDUP_STAGING_SQL:
+        cur.execute(sql)
+    retract_rollup(cur, REPLACED_SOURCE)
+    cur.execute(UPSERT_FROM_STAGING_SQL)
+    inserted = cur.fetchone()[0]
+    invalidate_days(cur, STAGING_TABLE)
+    return inserted
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_flights(
+    rows: Iterable[dict],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Callable[[int], None] | None = None,
+) -> dict:
+    """
+    Загружает рейсы (словари parse_message с row_hash) в таблицу flights.
+    Строки читаются потоково, коммит — один раз на пачку из batch_size строк.
+    progress(rows_inserted) вызывается после коммита каждой пачки.
+    Возвращает статистику: прочитано и записано строк, время и скорость (строк/сек).
+    """
+    started = _time.perf_counter()
+    read = 0
+    inserted = 0
+    batches = 0
+
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CREATE_STAGING_SQL)
+
+        mark = _time.perf_counter()
+        for batch in _batches(rows, batch_size):
+            # Время до готовности пачки — чтение и парсинг источника
+            read_done = _time.perf_counter()
+            record_ingest("read", len(batch), read_done - mark)
+
+            # DDL секций — до транзакции пачки, чтобы их блокировки не держались до коммита
+            ensure_partitions({row["date"] for row in batch if isinstance(row.get("date"), date)})
+            written = _flush(cur, batch)
+            conn.commit()
+            bump_data_version()
+            mark = _time.perf_counter()
+            record_ingest("insert", written, mark - read_done)
+
+            read += len(batch)
+            inserted += written
+            batches += 1
+            if progress:
+                progress(inserted)
+
+        cur.close()
+
+    elapsed = _time.perf_counter() - started
+    return {
+        "rows_read": read,
+        "rows_inserted": inserted,
+        "batches": batches,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(read / elapsed, 1) if elapsed > 0 else None,
+    }
+
+# --- Повторная загрузка: хеши файлов и строк ---
+
+def file_hash(path: str) -> str:
+    """SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def find_ingested_file(hash_: str) -> dict | None:
+    """Запись ingested_files о ранее загруженном файле с тем же содержимым."""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT filename, rows_inserted, ingested_at FROM ingested_files WHERE file_hash = :hash"),
+            {"hash": hash_},
+        ).mappings().first()
+    return dict(row) if row else None
+
+def record_ingested_file(hash_: str, filename: str | None, rows_inserted: int):
+    """Отмечает файл как полностью загруженный."""
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO ingested_files (file_hash, filename, rows_inserted)
+                VALUES (:hash, :filename, :rows)
+                ON CONFLICT (file_hash) DO NOTHING
+            """),
+            {"hash": hash_, "filename": filename, "rows": rows_inserted},
+        )
+
+def known_row_hashes(hashes: list[str]) -> set[str]:
+    """Хеши строк листа, рейсы которых уже есть в flights (для iter_excel)."""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT row_hash FROM flights WHERE row_hash = ANY(:hashes)"),
+            {"hashes": hashes},
+        )
+        return {row[0] for row in rows}
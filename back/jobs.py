@@ -0,0 +1,136 @@
+# jobs.py
+# --- Фоновые задачи загрузки файлов ---
+# Эндпоинты загрузки сохраняют файл во временный файл и сразу отвечают 202
+# с job_id; парсинг и загрузка (ingest.py) выполняются в фоне. Сообщения Excel
+# разбираются в пуле процессов (read_excel), а не в потоке процесса API.
+# Ход загрузки доступен по GET /jobs/{job_id}:
+#   status: queued | running | done | failed
+#   rows_parsed — разобрано строк, rows_skipped — пропущено уже загруженных
+#   строк (без парсинга), rows_inserted — закоммичено в flights.
+# Файл, уже загруженный ранее целиком (тот же хеш), не обрабатывается.
+# Реестр задач хранится в памяти процесса (последние JOBS_KEEP задач),
+# поэтому статус доступен только у того воркера, который принял файл.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import APIRouter, HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from ingest import (
+    file_hash, find_ingested_file, ingest_flights, known_row_hashes, record_ingested_file,
+)
+from parser import iter_excel
+
+router = APIRouter()
+
+JOBS_KEEP = int(os.getenv("JOBS_KEEP", "100"))
+
+_jobs: "OrderedDict[str, dict]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def create_job(filename: str | None) -> dict:
+    """Регистрирует новую задачу загрузки; старые задачи вытесняются."""
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "filename": filename,
+        "status": "queued",
+        "rows_parsed": 0,
+        "rows_skipped": 0,
+        "rows_inserted": 0,
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+        while len(_jobs) > JOBS_KEEP:
+            _jobs.popitem(last=False)
+    return job
+
+def get_job(job_id: str) -> dict | None:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+def _update(job: dict, **fields):
+    with _jobs_lock:
+        job.update(fields)
+
+async def save_upload(file: UploadFile, suffix: str = ".xlsx") -> str:
+    """Копирует загружаемый файл во временный файл (файл запроса закрывается после ответа)."""
+    tmp = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
+    try:
+        await run_in_threadpool(shutil.copyfileobj, file.file, tmp)
+    finally:
+        tmp.close()
+    return tmp.name
+
+def _counted(rows, job: dict):
+    """Пропускает строки парсера, обновляя счётчик rows_parsed задачи."""
+    for count, row in enumerate(rows, 1):
+        job["rows_parsed"] = count
+        yield row
+
+def _skip_known(job: dict):
+    """skip_known для iter_excel, учитывающий пропущенные строки в задаче."""
+    def skip(hashes: list[str]) -> set[str]:
+        known = known_row_hashes(hashes)
+        _update(job, rows_skipped=job["rows_skipped"] + len(known))
+        return known
+    return skip
+
+def read_excel(source, skip_known=None):
+    """
+    iter_excel для фоновых загрузок: сообщения парсятся в пуле процессов при
+    любом PARSE_WORKERS, поток загрузки только читает лист и пишет в базу —
+    разбор не занимает GIL процесса API и не замедляет запросы.
+    """
+    return iter_excel(source, skip_known=skip_known, isolate=True)
+
+def run_ingest_job(job: dict, path: str, require_rows: bool = False, reader: Callable = read_excel):
+    """
+    Выполняет загрузку файла path в flights (вызывается из BackgroundTasks
+    в пуле потоков). reader(файл, skip_known=...) читает строки рейсов:
+    read_excel (Excel) или columnar.iter_parquet (Parquet).
+    При require_rows файл без единой строки данных считается ошибкой.
+    """
+    _update(job, status="running", started_at=time.time())
+    try:
+        hash_ = file_hash(path)
+        if previous := find_ingested_file(hash_):
+            # Файл с тем же содержимым уже загружен
+            _update(job, status="done", result={"rows_inserted": 0, "duplicate_of": previous})
+            return
+
+        with open(path, "rb") as f:
+            stats = ingest_flights(
+                _counted(reader(f, skip_known=_skip_known(job)), job),
+                progress=lambda inserted: _update(job, rows_inserted=inserted),
+            )
+        stats["rows_skipped"] = job["rows_skipped"]
+        if require_rows and stats["rows_read"] == 0 and stats["rows_skipped"] == 0:
+            raise ValueError("Файл пустой или не удалось извлечь данные")
+        record_ingested_file(hash_, job["filename"], stats["rows_inserted"])
+        _update(job, status="done", result=stats, rows_inserted=stats["rows_inserted"])
+    except Exception as e:
+        _update(job, status="failed", error=str(e))
+    finally:
+        _update(job, finished_at=time.time())
+        os.unlink(path)
+
+@router.get("/jobs/{job_id}")
+def read_job(job_id: str):
+    """Статус и прогресс фоновой загрузки файла."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
@@ -1,27 +1,53 @@
-from fastapi import FastAPI, UploadFile, File, Depends, Query
+from fastapi import FastAPI, BackgroundTasks, UploadFile, File, Depends, Query, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import extract, func
+from sqlalchemy import and_, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Literal
-from datetime import datetime
-from geoalchemy2 import functions as geofunc  # Для работы с геометрическими типами PostGIS
+import json
+from typing import Literal
+from datetime import date, datetime
 
 from upload import router as upload_router
-from database import SessionLocal, engine, Base
-from models import Flight
-from crud import create_flight, get_flights
-from parser import parse_excel
-import schemas
-from schemas import FlightType, City, StatsResponse, FlightResponse
+from tiles import router as tiles_router
+from columnar import router as columnar_router
+from cube import router as cube_router, aggregate, DIMENSIONS, GROUP_KEYS, ROLLUP_DIMENSIONS
+from distributions import router as distributions_router
+from occupancy import router as occupancy_router
+from spatial import router as spatial_router
+from database import SessionLocal, get_db, get_async_db, pool_stats
+from migrate import apply_migrations
+from region_index import REGION_LOOKUP, get_region_index
+from models import Flight, FlightDailyStats, Region
+from crud import filter_conditions, flight_filters, get_flights, iter_flights, iter_geojson, parse_fields
+from jobs import router as jobs_router, create_job, run_ingest_job, save_upload
+from cache import cached
+import hll
+from metrics import MetricsMiddleware, render_metrics
+from schemas import FlightType, City, StatsResponse
 
-# Создание таблиц в базе данных, если их ещё нет
-Base.metadata.create_all(bind=engine)
+# Применение миграций схемы (migrations/*.sql), если они ещё не применены
+apply_migrations()
+
+# Индекс регионов в памяти (REGION_LOOKUP=memory) загружается один раз при старте
+if REGION_LOOKUP == "memory":
+    get_region_index()
 
 # --- Инициализация FastAPI ---
 app = FastAPI()
 
-# Подключение роутера для загрузки файлов
+# Подключение роутеров: загрузка файлов, фоновые задачи загрузки, векторные тайлы,
+# колоночная выгрузка (Parquet/Arrow), агрегация по разрезам (/flights/cube)
+# распределения длительности и высоты (/flights/distribution), одновременные
+# рейсы (/flights/occupancy) и пространственные запросы (/flights/spatial)
 app.include_router(upload_router)
+app.include_router(jobs_router)
+app.include_router(tiles_router)
+app.include_router(columnar_router)
+app.include_router(cube_router)
+app.include_router(distributions_router)
+app.include_router(occupancy_router)
+app.include_router(spatial_router)
 
 # --- CORS Middleware ---
 origins = [
@@ -33,226 +59,420 @@ app.add_middleware(
     allow_credentials=True,    
     allow_methods=["*"],       # Разрешить все HTTP методы
     allow_headers=["*"],       # Разрешить все заголовки
+    expose_headers=["ETag", "X-Next-Cursor"],  # Заголовки, доступные фронтенду
 )
 
-# --- Dependency: сессия базы данных ---
-def get_db():
-    """Создаёт сессию к БД и гарантирует её закрытие после использования."""
-    db = SessionLocal()
+# --- Метрики производительности (Prometheus, /metrics) ---
+app.add_middleware(MetricsMiddleware)
+
+
+# --- Получение рейсов ---
+@app.get("/flights/")
+def read_flights(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    after: int | None = Query(None, description="Курсор: flight_id последнего рейса предыдущей страницы"),
+    limit: int = Query(100, ge=1, le=10000, description="Размер страницы (для format=json)"),
+    fields: str | None = Query(None, description="Список полей через запятую, например uav_type,city,date"),
+    format: Literal["json", "ndjson"] = Query("json", description="json — страница, ndjson — поток всех рейсов"),
+    db: Session = Depends(get_db),
+):
+    """
+    Возвращает рейсы с фильтрами, keyset-пагинацией по flight_id и проекцией полей.
+    - format=json: страница из limit рейсов; курсор следующей страницы — в заголовке X-Next-Cursor
+    - format=ndjson: все рейсы после курсора построчно (NDJSON) через серверный курсор БД
+    """
+    try:
+        filters = dict(
+            uav_type=uav_type, city=city, startDate=startDate, endDate=endDate,
+            after=after, fields=parse_fields(fields),
+        )
+        flight_filters(startDate=startDate, endDate=endDate)  # проверка формата дат
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        def stream():
+            # Отдельная сессия: она должна жить, пока отдаётся ответ
+            stream_db = SessionLocal()
+            try:
+                for flight in iter_flights(stream_db, **filters):
+                    yield json.dumps(flight, ensure_ascii=False) + "\n"
+            finally:
+                stream_db.close()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    flights = get_flights(db, limit=limit, **filters)
+    headers = {}
+    if len(flights) == limit:
+        headers["X-Next-Cursor"] = str(flights[-1]["flight_id"])
+    return JSONResponse(content=flights, headers=headers)
+
+# --- GeoJSON для карты ---
+@app.get("/flights/geojson")
+def read_flights_geojson(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    tolerance: float | None = Query(None, gt=0, description="Допуск упрощения в градусах (по масштабу карты)"),
+):
+    """
+    Возвращает FeatureCollection (вылеты, посадки, маршруты) для карты.
+    GeoJSON собирается в PostGIS и передаётся клиенту потоком.
+    """
     try:
-        yield db
-    finally:
-        db.close()
+        flight_filters(startDate=startDate, endDate=endDate)  # проверка формата дат
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    def stream():
+        # Отдельная сессия: она должна жить, пока отдаётся ответ
+        stream_db = SessionLocal()
+        try:
+            yield from iter_geojson(
+                stream_db, tolerance=tolerance,
+                uav_type=uav_type, city=city, startDate=startDate, endDate=endDate,
+            )
+        finally:
+            stream_db.close()
 
-# --- Получение всех рейсов ---
-@app.get("/flights/", response_model=List[FlightResponse])
-def read_flights(db: Session = Depends(get_db)):
-    """Возвращает список всех рейсов."""
-    flights = get_flights(db)
-    return flights
+    return StreamingResponse(stream(), media_type="application/geo+json")
 
 # --- Получение типов БПЛА ---
 @app.get("/flights/types", response_model=list[FlightType])
-def get_uav_types(db: Session = Depends(get_db)):
+@cached("types")
+async def get_uav_types(db: AsyncSession = Depends(get_async_db)):
     """Возвращает список уникальных типов БПЛА."""
-    types = db.query(Flight.uav_type).distinct().all()
+    types = (await db.execute(select(Flight.uav_type).distinct())).all()
     return [{"uav_type": t[0]} for t in types]
 
 # --- Получение списка городов ---
 @app.get("/flights/cities", response_model=list[City])
-def get_cities(db: Session = Depends(get_db)):
+@cached("cities")
+async def get_cities(db: AsyncSession = Depends(get_async_db)):
     """Возвращает список уникальных городов."""
-    cities = db.query(Flight.city).distinct().all()
+    cities = (await db.execute(select(Flight.city).distinct())).all()
     return [{"city": c[0]} for c in cities]
 
+def _this_year(column):
+    """
+    Условие "дата в текущем году" диапазоном, а не extract(year): по нему
+    работают индексы по date и отсечение помесячных секций.
+    """
+    year = datetime.now().year
+    return and_(column >= date(year, 1, 1), column < date(year + 1, 1, 1))
+
+def _rollup_filters(uav_type, city, startDate, endDate) -> list:
+    """
+    Условия фильтров дашборда для суточной сводки flight_daily_stats.
+    Некорректная дата → 400 (ключ кеша её не проверяет, cache.normalize_date).
+    """
+    try:
+        return filter_conditions(FlightDailyStats, uav_type, city, startDate, endDate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # --- Эндпоинт: статистика рейсов ---
 @app.get("/flights/stats", response_model=StatsResponse)
-def get_stats(
+@cached("stats")
+async def get_stats(
     uav_type: str = None,
     city: str = None,
     startDate: str = None,
     endDate: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Возвращает статистику:
     - totalPeriod: количество рейсов за выбранный период
     - totalYear: количество рейсов за текущий год
     с применением фильтров по типу БПЛА, городу и датам.
+    Считается по суточной сводке flight_daily_stats.
     """
-    query = db.query(Flight)
-
-    if uav_type:
-        query = query.filter(Flight.uav_type == uav_type)
-    if city:
-        query = query.filter(Flight.city == city)
-    if startDate:
-        start_date_obj = datetime.fromisoformat(startDate).date()
-        query = query.filter(Flight.date >= start_date_obj)
-    if endDate:
-        end_date_obj = datetime.fromisoformat(endDate).date()
-        query = query.filter(Flight.date <= end_date_obj)
-
-    total_period = query.count()  # Количество рейсов за период
-    total_year = query.filter(extract('year', Flight.date) == datetime.now().year).count()  # За текущий год
+    query = select(FlightDailyStats).where(*_rollup_filters(uav_type, city, startDate, endDate))
+
+    flights = func.coalesce(func.sum(FlightDailyStats.flights), 0)
+    this_year = _this_year(FlightDailyStats.date)
+    total_period, total_year = (await db.execute(query.with_only_columns(
+        flights,  # Количество рейсов за период
+        func.coalesce(func.sum(FlightDailyStats.flights).filter(this_year), 0),  # За текущий год
+    ))).one()
 
     return {"totalPeriod": total_period, "totalYear": total_year}
 
+# --- Уникальные борты (reg_number) за период ---
+@app.get("/flights/stats/aircraft")
+@cached("stats_aircraft")
+async def get_aircraft_stats(
+    groupBy: str | None = Query(None, description=f"Группировка: {', '.join(sorted(ROLLUP_DIMENSIONS))}"),
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает приблизительное число уникальных бортов (reg_number) за период:
+    всего или по группам groupBy, с фильтрами дашборда. Считается объединением
+    скетчей HyperLogLog суточной сводки (hll.py); error — стандартная
+    относительная ошибка оценки.
+    """
+    if groupBy is not None and groupBy not in ROLLUP_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"groupBy: одно из {', '.join(sorted(ROLLUP_DIMENSIONS))}")
+    conditions = _rollup_filters(uav_type, city, startDate, endDate)
+
+    stats = FlightDailyStats
+    # Скетчи объединяются в базе (hll_union_agg, миграция 0010): по одному на группу
+    sketch = func.hll_union_agg(stats.aircraft_hll)
+    if groupBy is None:
+        registers = hll.registers((await db.execute(select(sketch).where(*conditions))).scalar())
+        return {"aircraft": hll.estimate(registers), "error": hll.relative_error(registers)}
+
+    name = DIMENSIONS[groupBy](stats)
+    # Регион — по id, месяц — по началу месяца (как в cube.py)
+    group_by = [GROUP_KEYS[groupBy](stats), name] if groupBy in GROUP_KEYS else [name]
+    query = (
+        select(name.label("name"), sketch.label("aircraft_hll"))
+        .select_from(stats)
+        .where(*conditions, stats.aircraft_hll.isnot(None))
+        .group_by(*group_by)
+        .order_by(name.asc().nulls_last())
+    )
+    if groupBy == "region":
+        query = query.join(Region, Region.id == stats.region_id)
+
+    result = []
+    for r in (await db.execute(query)).all():
+        registers = hll.registers(r.aircraft_hll)
+        result.append({"name": r.name, "aircraft": hll.estimate(registers), "error": hll.relative_error(registers)})
+    return result
+
 # --- Статистика по месяцам за выбранный период ---
 @app.get("/flights/stats/yearly")
-def get_yearly_stats(
+@cached("stats_yearly")
+async def get_yearly_stats(
     uav_type: str = None,
     city: str = None,
     startDate: str = None,
     endDate: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Возвращает ежемесячную статистику рейсов с группировкой по месяцам.
     """
-    query = db.query(Flight)
-
-    if uav_type:
-        query = query.filter(Flight.uav_type == uav_type)
-    if city:
-        query = query.filter(Flight.city == city)
-    if startDate:
-        query = query.filter(Flight.date >= datetime.fromisoformat(startDate))
-    if endDate:
-        query = query.filter(Flight.date <= datetime.fromisoformat(endDate))
-
-    results = (
-        query.with_entities(
-            func.to_char(Flight.date, 'Mon').label("month"),
-            func.date_trunc('month', Flight.date).label("month_start"),
-            func.count(Flight.flight_id).label("count"),
+    query = select(FlightDailyStats).where(*_rollup_filters(uav_type, city, startDate, endDate))
+
+    results = (await db.execute(
+        query.with_only_columns(
+            func.to_char(FlightDailyStats.date, 'Mon').label("month"),
+            func.date_trunc('month', FlightDailyStats.date).label("month_start"),
+            func.sum(FlightDailyStats.flights).label("count"),
         )
         .group_by("month", "month_start")
         .order_by("month_start")  # Сортировка по времени
-        .all()
-    )
+    )).all()
 
     return [{"name": r.month, "value": r.count} for r in results]
 
 # --- Эндпоинт: статистика по месяцам ---
 @app.get("/flights/monthly")
-def get_flights_monthly(
+@cached("monthly")
+async def get_flights_monthly(
     uav_type: str = None,
     city: str = None,
     startDate: str = None,
     endDate: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Возвращает количество рейсов по месяцам с возможностью фильтрации."""
-    query = db.query(
-        func.to_char(Flight.date, 'YYYY-MM'),  # Форматирование даты
-        func.count(Flight.flight_id)
+    # Одно и то же выражение в SELECT и GROUP BY (один параметр запроса)
+    month = func.to_char(FlightDailyStats.date, 'YYYY-MM')  # Форматирование даты
+    query = (
+        select(month, func.sum(FlightDailyStats.flights))
+        .where(*_rollup_filters(uav_type, city, startDate, endDate))
     )
 
-    if uav_type:
-        query = query.filter(Flight.uav_type == uav_type)
-    if city:
-        query = query.filter(Flight.city == city)
-    if startDate:
-        query = query.filter(Flight.date >= datetime.fromisoformat(startDate))
-    if endDate:
-        query = query.filter(Flight.date <= datetime.fromisoformat(endDate))
-
-    query = query.group_by(func.to_char(Flight.date, 'YYYY-MM')).order_by(func.to_char(Flight.date, 'YYYY-MM'))
-    results = query.all()
+    query = query.group_by(month).order_by(month)
+    results = (await db.execute(query)).all()
 
     return [{"month": r[0], "count": r[1]} for r in results]
 
 # --- Топ-10 по выбранной группе ---
+_TOP_DIMENSION = {"city": "city", "uav_type": "uav_type", "date": "month"}
+
 @app.get("/flights/top")
-def get_top_metrics(
+@cached("top")
+async def get_top_metrics(
     groupBy: Literal["city", "uav_type", "date"] = Query("date", description="Группировка"),
     uav_type: str | None = None,
     city: str | None = None,
     startDate: str | None = None,
     endDate: str | None = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Возвращает топ-10 рейсов по:
     - городу
     - типу БПЛА
     - дате (месяц)
-    с возможностью фильтрации.
+    с возможностью фильтрации. Частный случай /flights/cube.
     """
-    query = db.query(Flight)
-
-    if uav_type:
-        query = query.filter(Flight.uav_type == uav_type)
-    if city:
-        query = query.filter(Flight.city == city)
-    if startDate:
-        query = query.filter(Flight.date >= datetime.fromisoformat(startDate))
-    if endDate:
-        query = query.filter(Flight.date <= datetime.fromisoformat(endDate))
-
-    if groupBy == "city":
-        results = (
-            query.with_entities(Flight.city, func.count(Flight.flight_id))
-            .group_by(Flight.city)
-            .order_by(func.count(Flight.flight_id).desc())
-            .limit(10)
-            .all()
-        )
-        return [{"name": r[0], "value": r[1]} for r in results]
-
-    elif groupBy == "uav_type":
-        results = (
-            query.with_entities(Flight.uav_type, func.count(Flight.flight_id))
-            .group_by(Flight.uav_type)
-            .order_by(func.count(Flight.flight_id).desc())
-            .limit(10)
-            .all()
-        )
-        return [{"name": r[0], "value": r[1]} for r in results]
+    dimension = _TOP_DIMENSION[groupBy]
+    filters = dict(uav_type=uav_type, city=city, startDate=startDate, endDate=endDate)
+    _rollup_filters(**filters)  # проверка формата дат
+    rows = await aggregate(db, [dimension], ["count"], top=10, other=False, **filters)
+    return [{"name": r[dimension], "value": r["count"]} for r in rows]
 
-    elif groupBy == "date":
-        results = (
-            query.with_entities(
-                func.to_char(Flight.date, 'YYYY-MM'),
-                func.count(Flight.flight_id)
-            )
-            .group_by(func.to_char(Flight.date, 'YYYY-MM'))
-            .order_by(func.count(Flight.flight_id).desc())
-            .limit(10)
-            .all()
-        )
-        return [{"name": r[0], "value": r[1]} for r in results]
+# --- Сводный эндпоинт дашборда ---
+# Все виджеты дашборда (stats, stats/yearly, monthly, top по трём группировкам,
+# топ регионов) одним запросом к суточной сводке: GROUPING SETS считает
+# разрезы за один проход, FILTER — рейсы текущего года.
 
-# --- Загрузка Excel файла ---
-@app.post("/upload/")
-async def upload_file(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+def _top(rows: list[dict], n: int = 10) -> list[dict]:
+    return sorted(rows, key=lambda r: r["value"], reverse=True)[:n]
+
+@app.get("/flights/dashboard")
+@cached("dashboard")
+async def get_dashboard(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Загружает Excel файл с рейсами, парсит его и сохраняет в базу данных.
+    Возвращает данные всех виджетов дашборда с общими фильтрами:
+    - stats: как /flights/stats
+    - yearly: как /flights/stats/yearly
+    - monthly: как /flights/monthly
+    - top: {city, uav_type, date} — как /flights/top
+    - regionsTop: как /regions/top
     """
-    contents = await file.read()
-    df = parse_excel(contents)
-
-    # Преобразуем строки DataFrame в объекты FlightCreate и сохраняем в БД
-    for _, row in df.iterrows():
-        flight_data = schemas.FlightCreate(
-            uav_type=row['uav_type'],
-            reg_number=row['reg_number'],
-            date=row['date'],
-            dep_time=row['dep_time'],
-            arr_time=row['arr_time'],
-            duration=row['duration'],
-            dep_coord=row['dep_coord'],       # WKT POINT
-            dest_coord=row['dest_coord'],     # WKT POINT
-            min_alt=row['min_alt'],
-            max_alt=row['max_alt'],
-            route_coords=row['route_coords'], # WKT LINESTRING
-            city=row['city']
+    stats = FlightDailyStats
+    month = func.date_trunc('month', stats.date)
+    flights = func.sum(stats.flights)
+    this_year = _this_year(stats.date)
+
+    query = (
+        select(
+            # Биты grouping(): 1 — регион, 2 — месяц, 4 — тип, 8 — город (1 = столбец не в наборе)
+            func.grouping(stats.city, stats.uav_type, month, Region.id).label("grouping_set"),
+            stats.city,
+            stats.uav_type,
+            func.to_char(month, 'YYYY-MM').label("month"),
+            func.to_char(month, 'Mon').label("month_name"),
+            Region.nl_name_1.label("region"),
+            flights.label("flights"),
+            func.sum(stats.flights).filter(this_year).label("flights_year"),
         )
-        create_flight(db, flight_data)
+        .select_from(stats)
+        .outerjoin(Region, Region.id == stats.region_id)
+        .where(*_rollup_filters(uav_type, city, startDate, endDate))
+        .group_by(func.grouping_sets(
+            tuple_(),
+            tuple_(stats.city),
+            tuple_(stats.uav_type),
+            tuple_(month),
+            tuple_(Region.id, Region.nl_name_1),
+        ))
+        .order_by(month)
+    )
+    results = (await db.execute(query)).all()
+
+    total = {"totalPeriod": 0, "totalYear": 0}
+    by_city, by_type, by_month, by_region = [], [], [], []
+    for r in results:
+        if r.grouping_set == 0b1111:
+            total = {"totalPeriod": r.flights or 0, "totalYear": r.flights_year or 0}
+        elif r.grouping_set == 0b0111:
+            by_city.append({"name": r.city, "value": r.flights})
+        elif r.grouping_set == 0b1011:
+            by_type.append({"name": r.uav_type, "value": r.flights})
+        elif r.grouping_set == 0b1101:
+            by_month.append(r)
+        elif r.grouping_set == 0b1110 and r.region is not None:
+            by_region.append({"name": r.region, "value": r.flights})
+
+    return {
+        "stats": total,
+        "yearly": [{"name": r.month_name, "value": r.flights} for r in by_month],
+        "monthly": [{"month": r.month, "count": r.flights} for r in by_month],
+        "top": {
+            "city": _top(by_city),
+            "uav_type": _top(by_type),
+            "date": _top([{"name": r.month, "value": r.flights} for r in by_month]),
+        },
+        "regionsTop": _top(by_region),
+    }
+
+# --- Статистика по регионам (по точке вылета) ---
+def _region_stats_query(uav_type, city, startDate, endDate):
+    """Количество рейсов по регионам из суточной сводки с фильтрами дашборда."""
+    flights = func.sum(FlightDailyStats.flights)
+    query = (
+        select(Region.nl_name_1, flights)
+        .select_from(FlightDailyStats)
+        .join(Region, Region.id == FlightDailyStats.region_id)
+        .where(*_rollup_filters(uav_type, city, startDate, endDate))
+    )
+    return query.group_by(Region.id, Region.nl_name_1), flights
+
+@app.get("/regions/stats")
+@cached("regions_stats")
+async def get_region_stats(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Возвращает количество рейсов по всем регионам с возможностью фильтрации."""
+    query, _ = _region_stats_query(uav_type, city, startDate, endDate)
+    results = (await db.execute(query.order_by(Region.nl_name_1))).all()
+    return [{"name": r[0], "value": r[1]} for r in results]
+
+@app.get("/regions/top")
+@cached("regions_top")
+async def get_region_top(
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Возвращает топ-10 регионов по количеству рейсов с возможностью фильтрации."""
+    query, flights = _region_stats_query(uav_type, city, startDate, endDate)
+    results = (await db.execute(query.order_by(flights.desc()).limit(10))).all()
+    return [{"name": r[0], "value": r[1]} for r in results]
+
+# --- Загрузка Excel файла ---
+@app.post("/upload/", status_code=202)
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """
+    Принимает Excel файл с рейсами и ставит его загрузку в фоновую задачу:
+    потоковый парсинг и сохранение в базу данных через общий конвейер
+    пакетной загрузки (COPY + INSERT ... SELECT).
+    Прогресс загрузки — GET /jobs/{job_id}.
+    """
+    path = await save_upload(file)
+    job = create_job(file.filename)
+    background_tasks.add_task(run_ingest_job, job, path)
+
+    return {"status": "accepted", "job_id": job["job_id"]}
+
+# --- Метрики пулов соединений с БД ---
+@app.get("/db/pool")
+def read_pool_stats():
+    """Размер, занятость, ожидание и время подключения пулов соединений."""
+    return pool_stats()
 
-    return {"status": "ok"}
+# --- Метрики в формате Prometheus ---
+@app.get("/metrics")
+def read_metrics():
+    """Задержки маршрутов, SQL-запросы, конвейер загрузки и пулы соединений."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
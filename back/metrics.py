@@ -0,0 +1,213 @@
+# metrics.py
+# --- Метрики производительности (Prometheus) ---
+# - http_request_duration_seconds: задержка запросов по шаблону маршрута
+# - db_queries_total / db_query_duration_seconds: SQL-запросы (события движков
+#   SQLAlchemy), в т.ч. количество запросов на один HTTP-запрос
+# - ingest_*: строки и время чтения/парсинга и записи конвейера загрузки
+# - db_pool_*: состояние пулов соединений (database.pool_stats)
+# Метрики отдаются эндпоинтом /metrics (main.py).
+#
+# Журнал медленных запросов (логгер "slow_requests") включается переменной
+# SLOW_REQUEST_MS: для запросов дольше порога пишутся маршрут, число SQL,
+# повторяющиеся запросы (признак N+1) и тексты с планами EXPLAIN
+# самых долгих SELECT (не более SLOW_EXPLAIN_QUERIES).
+
+import contextvars
+import logging
+import os
+import time
+from collections import Counter as _Counter
+
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from database import engine, async_engine, pool_stats
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))  # 0 — журнал выключен
+SLOW_EXPLAIN_QUERIES = int(os.getenv("SLOW_EXPLAIN_QUERIES", "3"))
+# Запрос, повторённый за HTTP-запрос не меньше стольких раз, попадает в журнал
+SLOW_REPEAT_THRESHOLD = int(os.getenv("SLOW_REPEAT_THRESHOLD", "5"))
+
+slow_log = logging.getLogger("slow_requests")
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+HTTP_QUERIES = Histogram(
+    "http_request_db_queries", "Количество SQL-запросов на HTTP-запрос",
+    ["route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+DB_QUERIES = Counter("db_queries_total", "Выполнено SQL-запросов", ["engine"])
+DB_QUERY_TIME = Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL-запроса", ["engine"],
+)
+INGEST_ROWS = Counter("ingest_rows_total", "Строк в конвейере загрузки", ["stage"])
+INGEST_SECONDS = Counter("ingest_seconds_total", "Время конвейера загрузки", ["stage"])
+
+# --- SQL-запросы текущего HTTP-запроса ---
+
+class RequestQueries:
+    """
+    SQL-запросы одного HTTP-запроса: (движок, текст, параметры, секунды).
+    После отправки ответа (closed) запросы фоновых задач не учитываются.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.closed = False
+
+_request_queries: contextvars.ContextVar[RequestQueries | None] = contextvars.ContextVar(
+    "request_queries", default=None,
+)
+
+def _instrument_engine(sync_engine, name: str):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.metrics_started
+        DB_QUERIES.labels(name).inc()
+        DB_QUERY_TIME.labels(name).observe(elapsed)
+        current = _request_queries.get()
+        if current is not None and not current.closed:
+            current.queries.append((name, statement, parameters, elapsed))
+
+_instrument_engine(engine, "sync")
+_instrument_engine(async_engine.sync_engine, "async")
+
+# --- Конвейер загрузки ---
+
+def record_ingest(stage: str, rows: int, seconds: float):
+    """Учитывает пачку конвейера загрузки: stage = read (чтение и парсинг) | insert."""
+    INGEST_ROWS.labels(stage).inc(rows)
+    INGEST_SECONDS.labels(stage).inc(seconds)
+
+# --- Пулы соединений ---
+
+class PoolCollector:
+    """Метрики пулов соединений из database.pool_stats() в момент опроса."""
+
+    _GAUGES = {
+        "checked_out": "Выдано соединений",
+        "checked_in": "Свободных соединений в пуле",
+        "overflow": "Соединений сверх размера пула",
+        "waiting": "Ожидают свободного соединения",
+    }
+    _COUNTERS = {
+        "checkouts": "Выдач соединений",
+        "checkout_timeouts": "Таймаутов ожидания соединения",
+        "connects": "Установлено соединений",
+    }
+
+    def collect(self):
+        stats = pool_stats()
+        for key, doc in {**self._GAUGES, **self._COUNTERS}.items():
+            gauge = GaugeMetricFamily(f"db_pool_{key}", doc, labels=["pool"])
+            for pool, values in stats.items():
+                gauge.add_metric([pool], values[key])
+            yield gauge
+
+REGISTRY.register(PoolCollector())
+
+def render_metrics() -> tuple[bytes, str]:
+    """Текст метрик в формате Prometheus и его Content-Type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# --- Журнал медленных запросов ---
+
+def _explain_sync(statement: str, parameters) -> str:
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("EXPLAIN " + statement, parameters)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+        cur.close()
+        return plan
+    finally:
+        conn.rollback()
+        conn.close()
+
+async def _explain_async(statement: str, parameters) -> str:
+    async with async_engine.connect() as conn:
+        result = await conn.exec_driver_sql("EXPLAIN " + statement, tuple(parameters or ()))
+        return "\n".join(row[0] for row in result)
+
+async def _log_slow_request(method: str, route: str, elapsed: float, queries: list):
+    repeated = [
+        {"count": count, "statement": statement}
+        for statement, count in _Counter(q[1] for q in queries).most_common()
+        if count >= SLOW_REPEAT_THRESHOLD
+    ]
+    slowest = sorted(queries, key=lambda q: q[3], reverse=True)
+    explained = []
+    seen = set()
+    for name, statement, parameters, seconds in slowest:
+        if len(explained) >= SLOW_EXPLAIN_QUERIES:
+            break
+        if statement in seen or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+        seen.add(statement)
+        try:
+            if name == "async":
+                plan = await _explain_async(statement, parameters)
+            else:
+                plan = await run_in_threadpool(_explain_sync, statement, parameters)
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        explained.append({"ms": round(seconds * 1000, 2), "statement": statement, "plan": plan})
+
+    slow_log.warning(
+        "%s %s took %.1f ms, %d SQL queries (%.1f ms)",
+        method, route, elapsed * 1000, len(queries), sum(q[3] for q in queries) * 1000,
+        extra={"route": route, "repeated": repeated, "queries": explained},
+    )
+    for item in repeated:
+        slow_log.warning("  repeated x%d: %s", item["count"], item["statement"])
+    for item in explained:
+        slow_log.warning("  %.2f ms: %s\n%s", item["ms"], item["statement"], item["plan"])
+
+# --- Middleware ---
+
+class MetricsMiddleware:
+    """ASGI middleware: задержка и число SQL-запросов по шаблону маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = RequestQueries()
+        status_code = 500
+        started = time.perf_counter()
+        finished = None
+
+        async def send_wrapper(message):
+            nonlocal finished, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # Ответ отправлен; фоновые задачи (BackgroundTasks) в задержку не входят
+                finished = time.perf_counter()
+                current.closed = True
+            await send(message)
+
+        token = _request_queries.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = (finished or time.perf_counter()) - started
+            _request_queries.reset(token)
+            # Шаблон маршрута (/tiles/{z}/{x}/{y}.mvt), а не конкретный путь
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.labels(scope["method"], route, status_code).observe(elapsed)
+            HTTP_QUERIES.labels(route).observe(len(current.queries))
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                await _log_slow_request(scope["method"], route, elapsed, current.queries)
@@ -0,0 +1,66 @@
+# migrate.py
+# --- Версионированные миграции схемы ---
+# Миграции — SQL-файлы migrations/NNNN_название.sql, применяются по порядку
+# номеров. Применённые версии хранятся в таблице schema_migrations.
+#
+# Запуск вручную:  python migrate.py
+# При старте приложения миграции применяются автоматически (main.py).
+
+from pathlib import Path
+
+from database import raw_connection
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Ключ advisory lock: несколько воркеров не применяют миграции одновременно
+_LOCK_KEY = 7_310_042
+
+def list_migrations() -> list[tuple[str, Path]]:
+    """Список (версия, путь) всех файлов миграций по возрастанию версии."""
+    return sorted(
+        (path.name.split("_", 1)[0], path)
+        for path in MIGRATIONS_DIR.glob("*.sql")
+    )
+
+def apply_migrations() -> list[str]:
+    """Применяет ещё не применённые миграции, каждую в своей транзакции."""
+    applied_now = []
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version    VARCHAR PRIMARY KEY,
+                    name       VARCHAR NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            conn.commit()
+
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+
+            for version, path in list_migrations():
+                if version in applied:
+                    continue
+                try:
+                    cur.execute(path.read_text(encoding="utf-8"))
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, path.name),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied_now.append(path.name)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+            conn.commit()
+            cur.close()
+    return applied_now
+
+if __name__ == "__main__":
+    names = apply_migrations()
+    print("\n".join(names) if names else "schema is up to date")
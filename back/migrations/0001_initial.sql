@@ -0,0 +1,41 @@
+-- 0001_initial.sql
+-- Исходная схема (то, что раньше создавал Base.metadata.create_all).
+-- Все объекты создаются с IF NOT EXISTS, поэтому миграция безопасна
+-- для баз, созданных до появления миграций.
+
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+CREATE TABLE IF NOT EXISTS flights (
+    flight_id    SERIAL PRIMARY KEY,
+    uav_type     VARCHAR,
+    reg_number   VARCHAR,
+    date         DATE,
+    dep_time     TIME,
+    arr_time     TIME,
+    duration     INTERVAL,
+    dep_coord    geography(POINT, 4326),
+    dest_coord   geography(POINT, 4326),
+    min_alt      DOUBLE PRECISION,
+    max_alt      DOUBLE PRECISION,
+    route_coords geography(LINESTRING, 4326),
+    city         VARCHAR
+);
+CREATE INDEX IF NOT EXISTS ix_flights_flight_id ON flights (flight_id);
+
+CREATE TABLE IF NOT EXISTS russia_regions (
+    id        SERIAL PRIMARY KEY,
+    nl_name_1 VARCHAR,
+    geom      geometry(MULTIPOLYGON, 4326)
+);
+CREATE INDEX IF NOT EXISTS ix_russia_regions_id ON russia_regions (id);
+CREATE INDEX IF NOT EXISTS ix_russia_regions_nl_name_1 ON russia_regions (nl_name_1);
+
+CREATE TABLE IF NOT EXISTS flight_daily_stats (
+    id       SERIAL PRIMARY KEY,
+    date     DATE,
+    city     VARCHAR,
+    uav_type VARCHAR,
+    flights  INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_flight_daily_stats_key
+    ON flight_daily_stats (date, city, uav_type) NULLS NOT DISTINCT;
@@ -0,0 +1,25 @@
+-- 0002_flight_indexes.sql
+-- Индексы под фильтры эндпоинтов (uav_type, city, диапазон date),
+-- помесячную группировку и пространственные запросы.
+
+-- Фильтры по типу/городу с диапазоном дат и только по диапазону дат
+CREATE INDEX IF NOT EXISTS ix_flights_uav_type_date ON flights (uav_type, date);
+CREATE INDEX IF NOT EXISTS ix_flights_city_date ON flights (city, date);
+CREATE INDEX IF NOT EXISTS ix_flights_date ON flights (date);
+
+-- Помесячная группировка. date_trunc по timestamptz не IMMUTABLE,
+-- поэтому в индексе и в запросах используется date::timestamp
+CREATE INDEX IF NOT EXISTS ix_flights_month
+    ON flights (date_trunc('month', date::timestamp));
+
+-- Пространственные индексы (имена совпадают с теми, что создаёт GeoAlchemy2)
+CREATE INDEX IF NOT EXISTS idx_flights_dep_coord ON flights USING gist (dep_coord);
+CREATE INDEX IF NOT EXISTS idx_flights_dest_coord ON flights USING gist (dest_coord);
+CREATE INDEX IF NOT EXISTS idx_flights_route_coords ON flights USING gist (route_coords);
+
+-- Сводка: фильтр по типу или городу с диапазоном дат
+CREATE INDEX IF NOT EXISTS ix_flight_daily_stats_uav_type_date ON flight_daily_stats (uav_type, date);
+CREATE INDEX IF NOT EXISTS ix_flight_daily_stats_city_date ON flight_daily_stats (city, date);
+
+ANALYZE flights;
+ANALYZE flight_daily_stats;
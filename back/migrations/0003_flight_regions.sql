@@ -0,0 +1,17 @@
+-- 0003_flight_regions.sql
+-- Регион (russia_regions) точки вылета рейса, определяемый пространственным
+-- соединением при загрузке (ingest.py) или пакетно (python regions.py).
+
+CREATE INDEX IF NOT EXISTS idx_russia_regions_geom ON russia_regions USING gist (geom);
+
+ALTER TABLE flights ADD COLUMN IF NOT EXISTS region_id INTEGER;
+CREATE INDEX IF NOT EXISTS ix_flights_region_id_date ON flights (region_id, date);
+
+-- Регион входит в ключ суточной сводки
+ALTER TABLE flight_daily_stats ADD COLUMN IF NOT EXISTS region_id INTEGER;
+DROP INDEX IF EXISTS uq_flight_daily_stats_key;
+CREATE UNIQUE INDEX uq_flight_daily_stats_key
+    ON flight_daily_stats (date, city, uav_type, region_id) NULLS NOT DISTINCT;
+CREATE INDEX IF NOT EXISTS ix_flight_daily_stats_region_id_date ON flight_daily_stats (region_id, date);
+
+ANALYZE russia_regions;
@@ -0,0 +1,23 @@
+-- 0004_flight_natural_key.sql
+-- Повторная загрузка файлов без дубликатов (ingest.py):
+-- - sid: SID из сообщения; естественный ключ рейса — (sid, date, reg_number),
+--   при повторной загрузке строки с тем же ключом перезаписываются (ON CONFLICT);
+-- - row_hash: хеш исходной строки листа, уже загруженные строки
+--   пропускаются до парсинга;
+-- - ingested_files: хеши загруженных файлов, повторный файл не обрабатывается.
+-- Рейсы, загруженные раньше, остаются без sid и row_hash.
+
+ALTER TABLE flights ADD COLUMN IF NOT EXISTS sid VARCHAR;
+ALTER TABLE flights ADD COLUMN IF NOT EXISTS row_hash VARCHAR(32);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_flights_natural_key
+    ON flights (sid, date, reg_number) NULLS NOT DISTINCT
+    WHERE sid IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_flights_row_hash ON flights (row_hash);
+
+CREATE TABLE IF NOT EXISTS ingested_files (
+    file_hash     VARCHAR(64) PRIMARY KEY,
+    filename      VARCHAR,
+    rows_inserted INTEGER NOT NULL,
+    ingested_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,89 @@
+-- 0005_partition_flights.sql
+-- flights секционируется по месяцам (PARTITION BY RANGE (date)):
+-- - секции flights_yYYYYmMM создаются при загрузке (partitions.py);
+-- - flights_default — рейсы без даты (и даты, для которых секции ещё нет);
+-- - старые секции отсоединяются или архивируются: python partitions.py
+-- Запросы с условиями на date (эндпоинты, фильтры дашборда) затрагивают
+-- только секции нужных месяцев.
+--
+-- Существующие строки переносятся в новую таблицу. Первичный ключ
+-- секционированной таблицы обязан включать date, а рейсы без даты допустимы,
+-- поэтому flight_id уникален за счёт последовательности и индексируется
+-- обычным индексом. Уникальные индексы включают date; в ключе row_hash пустая
+-- date — тоже значение (NULLS NOT DISTINCT), иначе строка листа без даты
+-- вставлялась бы при каждой повторной загрузке.
+
+ALTER TABLE flights RENAME TO flights_unpartitioned;
+ALTER SEQUENCE flights_flight_id_seq OWNED BY NONE;
+
+CREATE TABLE flights (
+    flight_id    INTEGER NOT NULL DEFAULT nextval('flights_flight_id_seq'),
+    uav_type     VARCHAR,
+    reg_number   VARCHAR,
+    date         DATE,
+    dep_time     TIME,
+    arr_time     TIME,
+    duration     INTERVAL,
+    dep_coord    geography(POINT, 4326),
+    dest_coord   geography(POINT, 4326),
+    min_alt      DOUBLE PRECISION,
+    max_alt      DOUBLE PRECISION,
+    route_coords geography(LINESTRING, 4326),
+    city         VARCHAR,
+    region_id    INTEGER,
+    sid          VARCHAR,
+    row_hash     VARCHAR(32)
+) PARTITION BY RANGE (date);
+
+ALTER SEQUENCE flights_flight_id_seq OWNED BY flights.flight_id;
+
+CREATE TABLE flights_default PARTITION OF flights DEFAULT;
+
+-- Секции для месяцев, уже присутствующих в данных
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT DISTINCT date_trunc('month', date)::date
+        FROM flights_unpartitioned
+        WHERE date IS NOT NULL
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF flights FOR VALUES FROM (%L) TO (%L)',
+            'flights_' || to_char(month, '"y"YYYY"m"MM'), month, (month + interval '1 month')::date
+        );
+    END LOOP;
+END
+$$;
+
+INSERT INTO flights (
+    flight_id, uav_type, reg_number, date, dep_time, arr_time, duration,
+    dep_coord, dest_coord, min_alt, max_alt, route_coords, city, region_id, sid, row_hash
+)
+SELECT
+    flight_id, uav_type, reg_number, date, dep_time, arr_time, duration,
+    dep_coord, dest_coord, min_alt, max_alt, route_coords, city, region_id, sid, row_hash
+FROM flights_unpartitioned;
+
+DROP TABLE flights_unpartitioned;
+
+-- Индексы создаются на родительской таблице и наследуются секциями
+CREATE INDEX ix_flights_flight_id ON flights (flight_id);
+CREATE INDEX ix_flights_uav_type_date ON flights (uav_type, date);
+CREATE INDEX ix_flights_city_date ON flights (city, date);
+CREATE INDEX ix_flights_date ON flights (date);
+CREATE INDEX ix_flights_month ON flights (date_trunc('month', date::timestamp));
+CREATE INDEX ix_flights_region_id_date ON flights (region_id, date);
+CREATE INDEX idx_flights_dep_coord ON flights USING gist (dep_coord);
+CREATE INDEX idx_flights_dest_coord ON flights USING gist (dest_coord);
+CREATE INDEX idx_flights_route_coords ON flights USING gist (route_coords);
+
+CREATE UNIQUE INDEX uq_flights_natural_key
+    ON flights (sid, date, reg_number) NULLS NOT DISTINCT
+    WHERE sid IS NOT NULL;
+CREATE UNIQUE INDEX uq_flights_row_hash
+    ON flights (row_hash, date) NULLS NOT DISTINCT
+    WHERE row_hash IS NOT NULL;
+
+ANALYZE flights;
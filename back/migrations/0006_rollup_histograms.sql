@@ -0,0 +1,75 @@
+-- 0006_rollup_histograms.sql
+-- Распределения длительности и высоты в суточной сводке flight_daily_stats:
+-- - duration_seconds, duration_flights — сумма длительностей (налёт) и число
+--   рейсов с длительностью;
+-- - duration_hist, alt_hist — гистограммы с фиксированными границами
+--   (rollup.DURATION_EDGES, rollup.ALTITUDE_EDGES): элемент i — число рейсов
+--   в i-м интервале width_bucket.
+-- Гистограммы складываются поэлементно (hist_add, агрегат hist_sum), поэтому
+-- сводку можно дополнять и вычитать при загрузке, а перцентили для любых
+-- фильтров считаются по сумме гистограмм строк сводки.
+
+CREATE OR REPLACE FUNCTION hist_add(a integer[], b integer[]) RETURNS integer[]
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+BEGIN
+    IF a IS NULL THEN
+        RETURN b;
+    END IF;
+    IF b IS NULL THEN
+        RETURN a;
+    END IF;
+    FOR i IN 1 .. greatest(cardinality(a), cardinality(b)) LOOP
+        a[i] := coalesce(a[i], 0) + coalesce(b[i], 0);
+    END LOOP;
+    RETURN a;
+END
+$$;
+
+-- Гистограмма из size интервалов с весом weight в интервале bucket (с 0)
+CREATE OR REPLACE FUNCTION hist_one(bucket integer, size integer, weight integer) RETURNS integer[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN bucket IS NULL THEN NULL
+        ELSE array_fill(0, ARRAY[bucket]) || weight || array_fill(0, ARRAY[size - bucket - 1])
+    END
+$$;
+
+DROP AGGREGATE IF EXISTS hist_sum(integer[]);
+CREATE AGGREGATE hist_sum(integer[]) (
+    SFUNC = hist_add,
+    STYPE = integer[],
+    COMBINEFUNC = hist_add,
+    PARALLEL = SAFE
+);
+
+ALTER TABLE flight_daily_stats
+    ADD COLUMN IF NOT EXISTS duration_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS duration_flights INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS duration_hist INTEGER[],
+    ADD COLUMN IF NOT EXISTS alt_hist INTEGER[];
+
+-- Заполнение для уже загруженных рейсов (границы — как в rollup.py)
+UPDATE flight_daily_stats AS s
+SET duration_seconds = h.duration_seconds,
+    duration_flights = h.duration_flights,
+    duration_hist = h.duration_hist,
+    alt_hist = h.alt_hist
+FROM (
+    SELECT
+        date, city, uav_type, region_id,
+        coalesce(extract(epoch FROM sum(duration)), 0) AS duration_seconds,
+        count(duration) AS duration_flights,
+        hist_sum(hist_one(width_bucket(
+            extract(epoch FROM duration) / 60,
+            ARRAY[1, 2, 3, 5, 7, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 360, 480, 720, 1440]::numeric[]
+        ), 20, 1)) AS duration_hist,
+        hist_sum(hist_one(width_bucket(
+            max_alt,
+            ARRAY[10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000]::double precision[]
+        ), 12, 1)) AS alt_hist
+    FROM flights
+    GROUP BY date, city, uav_type, region_id
+) AS h
+WHERE s.date IS NOT DISTINCT FROM h.date
+  AND s.city IS NOT DISTINCT FROM h.city
+  AND s.uav_type IS NOT DISTINCT FROM h.uav_type
+  AND s.region_id IS NOT DISTINCT FROM h.region_id;
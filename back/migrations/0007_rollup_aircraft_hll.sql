@@ -0,0 +1,72 @@
+-- 0007_rollup_aircraft_hll.sql
+-- Скетч HyperLogLog уникальных бортов (reg_number) в суточной сводке
+-- flight_daily_stats: aircraft_hll — 1024 регистра по байту (точность p = 10,
+-- стандартная ошибка оценки ~3,3%).
+-- Регистр — младшие 10 бит 64-битного hashtextextended(reg_number), значение —
+-- позиция первой единицы в остальных битах. Объединение скетчей — поэлементный
+-- максимум (hll_union), поэтому сводку за любой период можно объединить,
+-- а оценку считает hll.py.
+
+CREATE OR REPLACE FUNCTION hll_add(state bytea, value text) RETURNS bytea
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+DECLARE
+    h bigint;
+    register integer;
+    rho integer;
+BEGIN
+    IF state IS NULL THEN
+        state := decode(repeat('00', 1024), 'hex');
+    END IF;
+    IF value IS NULL OR value = '' THEN
+        RETURN state;
+    END IF;
+    h := hashtextextended(value, 0);
+    register := (h & 1023)::integer;
+    -- Младшие 54 бита h >> 10: позиция первой единицы, 55 — если все нули
+    rho := position('1' IN ((h >> 10)::bit(54))::text);
+    IF rho = 0 THEN
+        rho := 55;
+    END IF;
+    IF rho > get_byte(state, register) THEN
+        state := set_byte(state, register, rho);
+    END IF;
+    RETURN state;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION hll_union(a bytea, b bytea) RETURNS bytea
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE (
+            SELECT decode(string_agg(
+                lpad(to_hex(greatest(get_byte(a, i), get_byte(b, i))), 2, '0'), '' ORDER BY i
+            ), 'hex')
+            FROM generate_series(0, length(a) - 1) AS i
+        )
+    END
+$$;
+
+DROP AGGREGATE IF EXISTS hll_agg(text);
+CREATE AGGREGATE hll_agg(text) (
+    SFUNC = hll_add,
+    STYPE = bytea,
+    COMBINEFUNC = hll_union,
+    PARALLEL = SAFE
+);
+
+ALTER TABLE flight_daily_stats ADD COLUMN IF NOT EXISTS aircraft_hll BYTEA;
+
+-- Заполнение для уже загруженных рейсов
+UPDATE flight_daily_stats AS s
+SET aircraft_hll = h.aircraft_hll
+FROM (
+    SELECT date, city, uav_type, region_id, hll_agg(reg_number) AS aircraft_hll
+    FROM flights
+    GROUP BY date, city, uav_type, region_id
+) AS h
+WHERE s.date IS NOT DISTINCT FROM h.date
+  AND s.city IS NOT DISTINCT FROM h.city
+  AND s.uav_type IS NOT DISTINCT FROM h.uav_type
+  AND s.region_id IS NOT DISTINCT FROM h.region_id;
@@ -0,0 +1,22 @@
+-- 0008_flight_occupancy.sql
+-- Кеш загрузки воздушного пространства по дням (occupancy.py): для каждого дня
+-- и группы (scope = all | city | region, key — город или id региона)
+-- пиковое число одновременных рейсов, время пика и почасовой профиль:
+-- hourly_peak — максимум одновременных рейсов за час, hourly_minutes — сумма
+-- минут полёта в этом часе (среднее число рейсов = минуты / 60).
+-- Строки дня считаются при первом запросе и удаляются при загрузке рейсов
+-- этого или предыдущего дня (ingest.py).
+
+CREATE TABLE IF NOT EXISTS flight_daily_occupancy (
+    date           DATE NOT NULL,
+    scope          VARCHAR NOT NULL,
+    key            VARCHAR,
+    peak           INTEGER NOT NULL,
+    peak_time      TIME,
+    hourly_peak    INTEGER[] NOT NULL,
+    hourly_minutes DOUBLE PRECISION[] NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_flight_daily_occupancy_key
+    ON flight_daily_occupancy (scope, key, date) NULLS NOT DISTINCT;
+CREATE INDEX IF NOT EXISTS ix_flight_daily_occupancy_scope_date
+    ON flight_daily_occupancy (scope, date);
@@ -0,0 +1,12 @@
+-- 0009_flight_geometry_indexes.sql
+-- GiST-индексы по геометрии (geometry(...)) точек и маршрутов для /flights/spatial.
+-- Фильтры по прямоугольнику, многоугольнику и региону (russia_regions.geom —
+-- geometry) считаются в плоских координатах lon/lat: предварительный отбор
+-- по && идёт по этим индексам, точная проверка ST_Intersects — по отобранным
+-- строкам. Радиус (ST_DWithin по geography) использует индексы из 0002/0005.
+
+CREATE INDEX IF NOT EXISTS idx_flights_dep_coord_geom ON flights USING gist (geometry(dep_coord));
+CREATE INDEX IF NOT EXISTS idx_flights_dest_coord_geom ON flights USING gist (geometry(dest_coord));
+CREATE INDEX IF NOT EXISTS idx_flights_route_coords_geom ON flights USING gist (geometry(route_coords));
+
+ANALYZE flights;
@@ -0,0 +1,36 @@
+-- 0010_hll_union_agg.sql
+-- Объединение скетчей HyperLogLog в базе: агрегат hll_union_agg(bytea)
+-- сворачивает aircraft_hll за период и группу в один скетч (GROUP BY в SQL),
+-- приложению передаётся по 1 КБ на группу вместо скетча на каждую строку сводки.
+-- hll_union — цикл по байтам с set_byte вместо generate_series + string_agg
+-- с разбором hex: без промежуточного набора строк и текста на каждый вызов,
+-- а агрегат вызывает её на каждую строку.
+
+CREATE OR REPLACE FUNCTION hll_union(a bytea, b bytea) RETURNS bytea
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+DECLARE
+    result bytea := a;
+    register integer;
+BEGIN
+    IF a IS NULL THEN
+        RETURN b;
+    END IF;
+    IF b IS NULL THEN
+        RETURN a;
+    END IF;
+    FOR register IN 0 .. length(a) - 1 LOOP
+        IF get_byte(b, register) > get_byte(result, register) THEN
+            result := set_byte(result, register, get_byte(b, register));
+        END IF;
+    END LOOP;
+    RETURN result;
+END
+$$;
+
+DROP AGGREGATE IF EXISTS hll_union_agg(bytea);
+CREATE AGGREGATE hll_union_agg(bytea) (
+    SFUNC = hll_union,
+    STYPE = bytea,
+    COMBINEFUNC = hll_union,
+    PARALLEL = SAFE
+);
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, Time, Float, Interval
+from sqlalchemy import Column, Integer, String, Date, Time, Float, Interval, Index, DateTime, LargeBinary, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from geoalchemy2 import Geography, Geometry
 from database import Base
 
@@ -18,6 +19,77 @@ class Flight(Base):
     max_alt = Column(Float, nullable=True)
     route_coords = Column(Geography("LINESTRING"), nullable=True)
     city = Column(String, nullable=True)
+    region_id = Column(Integer, nullable=True)  # russia_regions.id точки вылета
+    sid = Column(String, nullable=True)         # SID из сообщения
+    row_hash = Column(String(32), nullable=True)  # Хеш исходной строки листа
+
+    __table_args__ = (
+        # Естественный ключ рейса: повторная загрузка перезаписывает строку
+        Index(
+            "uq_flights_natural_key", "sid", "date", "reg_number",
+            unique=True, postgresql_nulls_not_distinct=True,
+            postgresql_where=text("sid IS NOT NULL"),
+        ),
+        # Хеш строки листа: повторная строка пропускается, в том числе без даты
+        Index(
+            "uq_flights_row_hash", "row_hash", "date",
+            unique=True, postgresql_nulls_not_distinct=True,
+            postgresql_where=text("row_hash IS NOT NULL"),
+        ),
+        # Помесячные секции (миграция 0005, partitions.py)
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
+class FlightDailyStats(Base):
+    """
+    Предагрегированные по (дата, город, тип БПЛА, регион) количество рейсов,
+    налёт, гистограммы длительности и высоты (границы — rollup.py) и скетч
+    HyperLogLog бортов (hll.py).
+    """
+    __tablename__ = "flight_daily_stats"
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=True)
+    city = Column(String, nullable=True)
+    uav_type = Column(String, nullable=True)
+    region_id = Column(Integer, nullable=True)
+    flights = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(Float, nullable=False, default=0)  # Сумма длительностей
+    duration_flights = Column(Integer, nullable=False, default=0)  # Рейсов с длительностью
+    duration_hist = Column(ARRAY(Integer), nullable=True)  # По rollup.DURATION_EDGES
+    alt_hist = Column(ARRAY(Integer), nullable=True)       # По rollup.ALTITUDE_EDGES
+    aircraft_hll = Column(LargeBinary, nullable=True)      # Уникальные reg_number
+
+    __table_args__ = (
+        # NULL-значения ключа считаются равными, чтобы ON CONFLICT работал и для них
+        Index(
+            "uq_flight_daily_stats_key", "date", "city", "uav_type", "region_id",
+            unique=True, postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+class FlightDailyOccupancy(Base):
+    """Пик одновременных рейсов и почасовой профиль за день по группе (occupancy.py)."""
+    __tablename__ = "flight_daily_occupancy"
+
+    # Ключ строки (scope, key, date) — для ORM; в базе это уникальный индекс
+    # uq_flight_daily_occupancy_key (key у scope = all — NULL)
+    date = Column(Date, primary_key=True)
+    scope = Column(String, primary_key=True)  # all | city | region
+    key = Column(String, primary_key=True, nullable=True)  # Город или id региона
+    peak = Column(Integer, nullable=False)
+    peak_time = Column(Time, nullable=True)
+    hourly_peak = Column(ARRAY(Integer), nullable=False)
+    hourly_minutes = Column(ARRAY(Float), nullable=False)
+
+class IngestedFile(Base):
+    """Загруженный файл (по хешу содержимого): повторно не обрабатывается."""
+    __tablename__ = "ingested_files"
+
+    file_hash = Column(String(64), primary_key=True)
+    filename = Column(String, nullable=True)
+    rows_inserted = Column(Integer, nullable=False)
+    ingested_at = Column(DateTime(timezone=True), server_default=text("now()"), nullable=False)
 
 class Region(Base):
     __tablename__ = "russia_regions"
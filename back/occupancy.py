@@ -0,0 +1,287 @@
+# occupancy.py
+# --- Загрузка воздушного пространства: одновременные рейсы ---
+#     GET /flights/occupancy?groupBy=city&startDate=2025-01-01&endDate=2025-12-31
+# Для периода — пиковое число одновременных рейсов (и когда оно достигнуто)
+# и почасовой профиль: среднее и максимальное число рейсов в воздухе в каждый
+# час суток. Всего, по городу (city) или по группам groupBy (city | region).
+#
+# Интервал рейса — [date + dep_time, + длительность), рейс с arr_time меньше
+# dep_time заканчивается на следующий день (как parser.calc_duration).
+# Рейсы, пересекающие полночь, делятся на части по дням.
+# День считается одним проходом (sweep line) по отсортированным событиям
+# начала и конца рейсов (O(n log n), NumPy) и сохраняется в
+# flight_daily_occupancy; запрос за год складывает готовые дни.
+# Загрузка удаляет дни своей пачки (invalidate_days) под advisory lock
+# _LOCK_KEY; расчёт дней берёт ту же блокировку (разделяемую) до чтения рейсов
+# и держит до коммита, поэтому дни, посчитанные без рейсов параллельной
+# загрузки, ею же и удаляются.
+
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import extract, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from cache import cached
+from database import get_async_db
+from models import Flight, FlightDailyOccupancy, FlightDailyStats, Region
+
+router = APIRouter()
+
+OCCUPANCY_TABLE = "flight_daily_occupancy"
+SCOPES = ("city", "region")
+
+# Ключ advisory lock: расчёт дней (разделяемая) и их удаление загрузкой
+_LOCK_KEY = 7_310_044
+
+_DAY = 86400
+_HOURS = 24
+
+# Порядок событий в один момент: конец рейса, начало часа, начало рейса —
+# рейс, закончившийся в 10:00, не пересекается с начавшимся в 10:00
+_END, _MARK, _START = 0, 1, 2
+
+def sweep(group: np.ndarray, start: np.ndarray, end: np.ndarray, n_groups: int) -> dict:
+    """
+    Одновременные рейсы по группам (0 … n_groups - 1) в пределах суток.
+    start, end — секунды от начала суток (0 ≤ start < end ≤ 86400).
+    Возвращает массивы по группам: peak, peak_time (секунды), hourly_peak
+    и hourly_minutes (n_groups × 24).
+    """
+    n = len(start)
+    marks = np.arange(_HOURS) * 3600
+    ev_group = np.concatenate([group, group, np.repeat(np.arange(n_groups), _HOURS)])
+    ev_time = np.concatenate([start, end, np.tile(marks, n_groups)]).astype(np.int64)
+    ev_kind = np.concatenate([np.full(n, _START), np.full(n, _END), np.full(n_groups * _HOURS, _MARK)])
+    order = np.lexsort((ev_kind, ev_time, ev_group))
+    ev_group, ev_time, ev_kind = ev_group[order], ev_time[order], ev_kind[order]
+
+    # Все рейсы группы заканчиваются в её сутках, поэтому сумма по группе
+    # равна нулю и общая накопленная сумма — число рейсов в воздухе в группе
+    delta = np.where(ev_kind == _START, 1, np.where(ev_kind == _END, -1, 0))
+    value = np.cumsum(delta)
+
+    # Отрезки (группа, час) начинаются с меток начала часа
+    segments = np.flatnonzero(ev_kind == _MARK)
+    hourly_peak = np.maximum.reduceat(value, segments).reshape(n_groups, _HOURS)
+
+    # Минуты полёта: значение × время до следующего события той же группы
+    dt = np.diff(ev_time, append=ev_time[-1])
+    dt[np.flatnonzero(np.diff(ev_group, append=ev_group[-1] + 1))] = 0
+    hourly_minutes = np.add.reduceat(value * dt, segments).reshape(n_groups, _HOURS) / 60
+
+    peak = hourly_peak.max(axis=1)
+    at_peak = np.flatnonzero(value == peak[ev_group])
+    groups, first = np.unique(ev_group[at_peak], return_index=True)
+    peak_time = np.zeros(n_groups, dtype=np.int64)
+    peak_time[groups] = ev_time[at_peak[first]]
+
+    return {"peak": peak, "peak_time": peak_time, "hourly_peak": hourly_peak, "hourly_minutes": hourly_minutes}
+
+def day_pieces(day: np.ndarray, dep: np.ndarray, arr: np.ndarray) -> tuple[np.ndarray, ...]:
+    """
+    Части интервалов рейсов по суткам: (индекс рейса, день, начало, конец).
+    day — номер дня рейса, dep/arr — секунды от полуночи. Рейсы нулевой
+    длительности отбрасываются.
+    """
+    duration = np.where(arr < dep, arr + _DAY - dep, arr - dep)
+    index = np.flatnonzero(duration > 0)
+    end = dep[index] + duration[index]
+    crossing = index[end > _DAY]
+    return (
+        np.concatenate([index, crossing]),
+        np.concatenate([day[index], day[crossing] + 1]),
+        np.concatenate([dep[index], np.zeros(len(crossing), dtype=dep.dtype)]),
+        np.concatenate([np.minimum(end, _DAY), arr[crossing]]),
+    )
+
+def compute_days(first: date, days: int, flights: dict) -> list[dict]:
+    """
+    Строки flight_daily_occupancy за дни first … first + days - 1 по рейсам
+    flights (массивы date_index — номер дня относительно first, может быть -1,
+    dep, arr — секунды, city, region).
+    """
+    index, day, start, end = day_pieces(flights["date_index"], flights["dep"], flights["arr"])
+    inside = (day >= 0) & (day < days)
+    index, day, start, end = index[inside], day[inside], start[inside], end[inside]
+
+    rows = []
+
+    def add_rows(scope, keys, group_day, result):
+        for g, (key, d) in enumerate(zip(keys, group_day)):
+            peak = int(result["peak"][g])
+            rows.append({
+                "date": first + timedelta(days=int(d)),
+                "scope": scope,
+                "key": key,
+                "peak": peak,
+                "peak_time": (datetime.min + timedelta(seconds=int(result["peak_time"][g]))).time() if peak else None,
+                "hourly_peak": result["hourly_peak"][g].tolist(),
+                "hourly_minutes": result["hourly_minutes"][g].round(2).tolist(),
+            })
+
+    # Все рейсы: строка на каждый день, в том числе без рейсов
+    add_rows("all", [None] * days, range(days), sweep(day, start, end, days))
+
+    for scope in SCOPES:
+        values = flights[scope][index]
+        known = np.array([v is not None for v in values], dtype=bool)
+        if not known.any():
+            continue
+        keys = values[known].astype(str)
+        pairs, group = np.unique(
+            np.rec.fromarrays([day[known], keys]), return_inverse=True,
+        )
+        add_rows(scope, pairs.f1.tolist(), pairs.f0.tolist(),
+                 sweep(group.ravel(), start[known], end[known], len(pairs)))
+    return rows
+
+async def _fetch_flights(db: AsyncSession, first: date, last: date) -> dict:
+    """Интервалы рейсов дней first - 1 … last (предыдущий день — для рейсов через полночь)."""
+    query = select(
+        Flight.date,
+        extract('epoch', Flight.dep_time),
+        extract('epoch', Flight.arr_time),
+        Flight.city,
+        Flight.region_id,
+    ).where(
+        Flight.date >= first - timedelta(days=1),
+        Flight.date <= last,
+        Flight.dep_time.isnot(None),
+        Flight.arr_time.isnot(None),
+    )
+    rows = (await db.execute(query)).all()
+    return {
+        "date_index": np.array([(r[0] - first).days for r in rows], dtype=np.int64),
+        "dep": np.array([int(r[1]) for r in rows], dtype=np.int64),
+        "arr": np.array([int(r[2]) for r in rows], dtype=np.int64),
+        "city": np.array([r[3] for r in rows], dtype=object),
+        "region": np.array([r[4] for r in rows], dtype=object),
+    }
+
+async def _missing_days(db: AsyncSession, first: date, last: date) -> list[date]:
+    occupancy = FlightDailyOccupancy
+    done = set((await db.execute(
+        select(occupancy.date).where(
+            occupancy.scope == "all", occupancy.date >= first, occupancy.date <= last,
+        )
+    )).scalars())
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    return [d for d in days if d not in done]
+
+async def ensure_days(db: AsyncSession, first: date, last: date):
+    """Считает и сохраняет ещё не посчитанные дни периода."""
+    occupancy = FlightDailyOccupancy
+    if not await _missing_days(db, first, last):
+        return
+
+    # Загрузка, закоммиченная между чтением рейсов и вставкой дней, оставила бы
+    # их устаревшими навсегда: блокировка до коммита (снимается им же)
+    await db.execute(select(func.pg_advisory_xact_lock_shared(_LOCK_KEY)))
+    # Повторная проверка: дни мог посчитать параллельный запрос
+    missing = await _missing_days(db, first, last)
+    if not missing:
+        await db.commit()
+        return
+
+    start, end = missing[0], missing[-1]
+    flights = await _fetch_flights(db, start, end)
+    rows = await run_in_threadpool(compute_days, start, (end - start).days + 1, flights)
+    missing = set(missing)
+    rows = [r for r in rows if r["date"] in missing]
+    # Параллельный запрос мог посчитать те же дни
+    await db.execute(insert(occupancy).on_conflict_do_nothing(), rows)
+    await db.commit()
+
+def invalidate_days(cur, staging: str):
+    """
+    Удаляет посчитанные дни, затронутые пачкой staging-таблицы: дни рейсов
+    и следующие за ними (рейсы через полночь). Курсор вызывающей транзакции;
+    блокировка _LOCK_KEY держится до её коммита — расчёт дней (ensure_days)
+    ждёт, пока рейсы пачки не станут видны.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_KEY,))
+    cur.execute(f"""
+        DELETE FROM {OCCUPANCY_TABLE}
+        WHERE date IN (
+            SELECT date FROM {staging} WHERE date IS NOT NULL
+            UNION
+            SELECT date + 1 FROM {staging} WHERE date IS NOT NULL
+        )
+    """)
+
+def _summary(rows: list, days: int) -> dict:
+    peak_row = max(rows, key=lambda r: (r.peak, -r.date.toordinal()))
+    hourly_peak = np.max([r.hourly_peak for r in rows], axis=0)
+    hourly_minutes = np.sum([r.hourly_minutes for r in rows], axis=0)
+    return {
+        "peak": peak_row.peak,
+        "peak_at": datetime.combine(peak_row.date, peak_row.peak_time).isoformat() if peak_row.peak else None,
+        "hourly": [
+            {"hour": h, "avg": round(float(hourly_minutes[h]) / 60 / days, 3), "peak": int(hourly_peak[h])}
+            for h in range(_HOURS)
+        ],
+    }
+
+@router.get("/flights/occupancy")
+@cached("occupancy")
+async def get_occupancy(
+    groupBy: str | None = Query(None, description="Группировка: city | region"),
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает пик одновременных рейсов (peak, peak_at) и почасовой профиль
+    (hourly: среднее avg и максимум peak рейсов в воздухе) за период: всего,
+    по городу city или по группам groupBy. Без дат — весь период данных.
+    """
+    if groupBy is not None and groupBy not in SCOPES:
+        raise HTTPException(status_code=400, detail="groupBy: city | region")
+    if city and groupBy == "region":
+        raise HTTPException(status_code=400, detail="Фильтр city — только без groupBy или с groupBy=city")
+    try:
+        first = datetime.fromisoformat(startDate).date() if startDate else None
+        last = datetime.fromisoformat(endDate).date() if endDate else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if first is None or last is None:
+        low, high = (await db.execute(
+            select(func.min(FlightDailyStats.date), func.max(FlightDailyStats.date))
+        )).one()
+        first, last = first or low, last or high
+    if first is None or last is None or first > last:
+        return [] if groupBy else None
+
+    await ensure_days(db, first, last)
+    days = (last - first).days + 1
+
+    occupancy = FlightDailyOccupancy
+    scope = groupBy or ("city" if city else "all")
+    query = select(occupancy).where(
+        occupancy.scope == scope, occupancy.date >= first, occupancy.date <= last,
+    )
+    if city:
+        query = query.where(occupancy.key == city)
+    rows = (await db.execute(query)).scalars().all()
+
+    if groupBy is None:
+        return _summary(rows, days) if rows else None
+
+    groups = {}
+    for r in rows:
+        groups.setdefault(r.key, []).append(r)
+    names = {}
+    if groupBy == "region":
+        names = dict((await db.execute(select(Region.id, Region.nl_name_1))).all())
+    return sorted(
+        (
+            {"name": names.get(int(key), key) if groupBy == "region" else key, **_summary(group, days)}
+            for key, group in groups.items()
+        ),
+        key=lambda g: g["peak"], reverse=True,
+    )
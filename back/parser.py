@@ -1,10 +1,17 @@
 # parser.py
 # --- Модуль для парсинга сообщений и Excel файлов с рейсами ---
 
+import hashlib
+import os
 import re
 import pandas as pd
 from datetime import datetime, timedelta, time
 from io import BytesIO
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Callable, Iterator
+from openpyxl import load_workbook
 
 # --- Словарь: регион → город ---
 region_to_city = {
@@ -25,13 +32,38 @@ region_to_city = {
     "Центр ЕС ОрВД": "Москва",
 }
 
+# --- Предкомпилированные шаблоны ---
+
+_COORD_RE = re.compile(r"(\d{2})(\d{2})([NS])(\d{3})(\d{2})([EW])")
+_NON_DIGIT_RE = re.compile(r"\D")
+
+# Теги сообщения разбираются за один проход finditer.
+# Каждая ветка поглощает только первый символ тега, а остаток проверяется
+# lookahead-ом, поэтому находятся вхождения в любой позиции (в том числе
+# внутри значений других полей) — так же, как при отдельных
+# re.search/re.findall по каждому полю. Номер группы определяет поле.
+_TOKEN_RE = re.compile(
+    r"S(?=ID/(\w+))"                           # 1: идентификатор рейса
+    r"|T(?=YP/(\w+))"                          # 2: тип БПЛА
+    r"|R(?=EG/(\w+))"                          # 3: регистрационный номер
+    r"|D(?=OF/(\d{6}))"                        # 4: дата рейса
+    r"|D(?=EP/(\d{4,5}[NS]\d{4,5}[EW]))"       # 5: координаты взлета
+    r"|D(?=EST/(\d{4,5}[NS]\d{4,5}[EW]))"      # 6: координаты посадки
+    r"|-(?=M(\d{4})/M(\d{4}))"                 # 7, 8: высоты
+    r"|Z(?=ZZZ(\d{4,5}))"                      # 9: время
+)
+# Точки маршрута встречаются чаще остальных полей и не перекрываются —
+# их быстрее собрать отдельным findall на уровне C
+_POINT_RE = re.compile(r"\d{4}[NS]\d{5}[EW]")
+_SID, _TYP, _REG, _DOF, _DEP, _DEST, _MIN_ALT, _MAX_ALT, _TIME = range(1, 10)
+
 # --- Вспомогательные функции ---
 
 def convert_coord(coord: str) -> tuple | None:
     """
     Конвертирует координаты из формата DDMMNDDDMME → (lat, lon)
     """
-    m = re.match(r"(\d{2})(\d{2})([NS])(\d{3})(\d{2})([EW])", coord)
+    m = _COORD_RE.match(coord)
     if not m:
         return None
 
@@ -46,18 +78,46 @@ def convert_coord(coord: str) -> tuple | None:
 
     return lat, lon
 
+@lru_cache(maxsize=65536)
+def _point_to_lonlat(p: str) -> str:
+    """
+    Точка маршрута DDMMNDDDMME (фиксированная ширина, уже проверена _TOKEN_RE)
+    → "lon lat" для WKT. Вычисления совпадают с convert_coord;
+    точки зон и маршрутов в выгрузках повторяются, поэтому результат кешируется.
+    """
+    lat = int(p[0:2]) + int(p[2:4]) / 60
+    lon = int(p[5:8]) + int(p[8:10]) / 60
+    if p[4] == "S":
+        lat = -lat
+    if p[10] == "W":
+        lon = -lon
+    return f"{lon} {lat}"
+
+@lru_cache(maxsize=16384)
+def _parse_hhmm(t: str) -> time | None:
+    """Разбирает первые 4 цифры "HHMM" (значения повторяются — кешируем)."""
+    try:
+        return datetime.strptime(t, "%H%M").time()
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=16384)
+def _parse_dof(value: str):
+    """Разбирает дату DOF в формате YYMMDD (значения повторяются — кешируем)."""
+    try:
+        return datetime.strptime(value, "%y%m%d").date()
+    except ValueError:
+        return None
+
 def normalize_time(t: str | None) -> time | None:
     """
     Преобразует строку времени из Excel в объект datetime.time
     """
     if not t:
         return None
-    t = re.sub(r'\D', '', str(t))
+    t = _NON_DIGIT_RE.sub('', str(t))
     if len(t) >= 4:
-        try:
-            return datetime.strptime(t[:4], "%H%M").time()
-        except ValueError:
-            return None
+        return _parse_hhmm(t[:4])
     return None
 
 def calc_duration(dep_time: time | None, arr_time: time | None, flight_date) -> timedelta | None:
@@ -103,6 +163,8 @@ def parse_message(msg: str, region: str = None) -> dict:
     - дата, время взлета и посадки, длительность
     - координаты взлета, посадки и маршрута
     - город и высоты
+    Теги извлекаются за один проход по сообщению (_TOKEN_RE),
+    точки маршрута — одним findall (_POINT_RE).
     """
     result = {
         "flight_id": None,
@@ -120,46 +182,49 @@ def parse_message(msg: str, region: str = None) -> dict:
         "route_coords": "",
     }
 
+    # Первое вхождение каждого поля; время — все вхождения
+    first = {}
+    times = []
+    for m in _TOKEN_RE.finditer(msg):
+        field = m.lastindex
+        if field == _TIME:
+            times.append(m.group(_TIME))
+        elif field not in first:
+            first[field] = m
+
     # Высоты
-    if m := re.search(r"-M(\d{4})/M(\d{4})", msg):
-        result["min_alt"], result["max_alt"] = map(int, m.groups())
+    if m := first.get(_MAX_ALT):
+        result["min_alt"], result["max_alt"] = int(m.group(_MIN_ALT)), int(m.group(_MAX_ALT))
 
     # Маршрут
-    coords = re.findall(r"\d{4}[NS]\d{5}[EW]", msg)
-    converted = [convert_coord(c) for c in coords]
-    converted = [c for c in converted if c]  # убираем None
-
-    if len(converted) < 2:
+    points = _POINT_RE.findall(msg)
+    if len(points) < 2:
         result["route_coords"] = None
     else:
-        linestring = ", ".join(f"{lon} {lat}" for lat, lon in converted)
+        linestring = ", ".join(map(_point_to_lonlat, points))
         result["route_coords"] = f"LINESTRING({linestring})"
 
     # Основные поля
-    if m := re.search(r"SID/([\w\d]+)", msg):
-        result["flight_id"] = m.group(1)
-    if m := re.search(r"TYP/([\w\d]+)", msg):
-        result["uav_type"] = m.group(1)
-    if m := re.search(r"REG/([\w\d]+)", msg):
-        result["reg_number"] = m.group(1)
-    if m := re.search(r"DOF/(\d{6})", msg):
-        try:
-            result["date"] = datetime.strptime(m.group(1), "%y%m%d").date()
-        except ValueError:
-            pass
+    if m := first.get(_SID):
+        result["flight_id"] = m.group(_SID)
+    if m := first.get(_TYP):
+        result["uav_type"] = m.group(_TYP)
+    if m := first.get(_REG):
+        result["reg_number"] = m.group(_REG)
+    if m := first.get(_DOF):
+        result["date"] = _parse_dof(m.group(_DOF))
 
     # Время
-    times = re.findall(r"ZZZZ(\d{4,5})", msg)
     if times:
-        result["dep_time"] = normalize_time(times[0]) if len(times) > 0 else None
+        result["dep_time"] = normalize_time(times[0])
         result["arr_time"] = normalize_time(times[1]) if len(times) > 1 else None
         flight_date = result["date"] or datetime.today().date()
         result["duration"] = calc_duration(result["dep_time"], result["arr_time"], flight_date)
 
     # DEP / DEST координаты
-    for key, prefix in [("dep_coord", "DEP"), ("dest_coord", "DEST")]:
-        if m := re.search(fr"{prefix}/(\d{{4,5}}[NS]\d{{4,5}}[EW])", msg):
-            if (latlon := convert_coord(m.group(1))):
+    for key, field in [("dep_coord", _DEP), ("dest_coord", _DEST)]:
+        if m := first.get(field):
+            if (latlon := convert_coord(m.group(field))):
                 lat, lon = latlon
                 result[key] = f"POINT({lon} {lat})"
 
@@ -167,28 +232,143 @@ def parse_message(msg: str, region: str = None) -> dict:
 
 # --- Парсинг Excel ---
 
-def parse_excel(file_bytes: bytes, sheet_name=0) -> pd.DataFrame:
+# Количество процессов для параллельного парсинга (1 — без пула процессов)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "1"))
+# Размер пачки строк, отправляемой в один процесс
+PARSE_CHUNK_SIZE = int(os.getenv("PARSE_CHUNK_SIZE", "2000"))
+
+def parse_row(region_name, messages) -> dict:
+    """
+    Парсит одну строку листа: регион и ячейки с сообщениями.
+    Поля объединяются по правилу "побеждает первое непустое значение".
+    """
+    city_name = region_to_city.get(str(region_name), str(region_name))
+    row_parsed = {}
+
+    for value in messages:
+        msg = str(value) if pd.notna(value) else ""
+        parsed = parse_message(msg, region=city_name)
+        for k, v in parsed.items():
+            if row_parsed.get(k) in (None, "", "0"):
+                row_parsed[k] = v
+
+    return row_parsed
+
+def _parse_chunk(rows: list[tuple]) -> list[dict]:
+    """Парсит пачку строк (выполняется в процессе пула)."""
+    parsed_rows = []
+    for row in rows:
+        row_parsed = parse_row(row[0], row[1:])
+        if row_parsed:
+            parsed_rows.append(row_parsed)
+    return parsed_rows
+
+def parse_excel(file_bytes: bytes, sheet_name=0, workers: int | None = None) -> pd.DataFrame:
     """
     Парсит Excel файл с рейсами:
     - Первый столбец: регион
     - Остальные столбцы: сообщения
+    При workers > 1 строки листа делятся на пачки и парсятся в пуле
+    процессов; результаты объединяются в исходном порядке строк.
     """
+    workers = PARSE_WORKERS if workers is None else workers
     df = pd.read_excel(BytesIO(file_bytes), sheet_name=sheet_name)
-    parsed_rows = []
+    rows = list(df.itertuples(index=False, name=None))
 
-    for _, row in df.iterrows():
-        region_name = row[df.columns[0]]
-        city_name = region_to_city.get(str(region_name), str(region_name))
-        row_parsed = {}
+    if workers > 1 and len(rows) > PARSE_CHUNK_SIZE:
+        chunks = [rows[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(rows), PARSE_CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map возвращает результаты в порядке пачек
+            parsed_rows = [r for chunk in pool.map(_parse_chunk, chunks) for r in chunk]
+    else:
+        parsed_rows = _parse_chunk(rows)
 
-        for col in df.columns[1:]:  # пропускаем первый столбец (регион)
-            msg = str(row[col]) if pd.notna(row[col]) else ""
-            parsed = parse_message(msg, region=city_name)
-            for k, v in parsed.items():
-                if row_parsed.get(k) in (None, "", "0"):
-                    row_parsed[k] = v
+    return pd.DataFrame(parsed_rows)
 
-        if row_parsed:
+# --- Потоковый парсинг Excel ---
+
+def row_hash(row: tuple) -> str:
+    """Хеш исходной строки листа (регион и ячейки сообщений)."""
+    content = "\x1f".join("" if v is None else str(v) for v in row)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+def _parse_hashed_chunk(rows: list[tuple]) -> list[dict]:
+    """Парсит пачку пар (хеш строки, строка); хеш сохраняется в row_hash."""
+    parsed_rows = []
+    for hash_, row in rows:
+        if row_parsed := parse_row(row[0], row[1:]):
+            row_parsed["row_hash"] = hash_
             parsed_rows.append(row_parsed)
+    return parsed_rows
 
-    return pd.DataFrame(parsed_rows)
+def _iter_chunks(rows, size: int) -> Iterator[list]:
+    """Группирует поток строк в пачки по size строк."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_excel(
+    source,
+    sheet_name=0,
+    workers: int | None = None,
+    skip_known: Callable[[list[str]], set[str]] | None = None,
+    isolate: bool = False,
+) -> Iterator[dict]:
+    """
+    Потоково парсит Excel файл (bytes или файловый объект) и по одному
+    возвращает словари рейсов. Лист читается в режиме openpyxl read_only,
+    поэтому потребление памяти не зависит от размера файла.
+    Формат листа тот же, что у parse_excel; полностью пустые строки пропускаются.
+    Каждый словарь содержит row_hash — хеш исходной строки листа;
+    skip_known(хеши пачки) возвращает уже загруженные хеши, такие строки
+    пропускаются без парсинга.
+    При workers > 1 пачки строк парсятся в пуле процессов (не более
+    2 * workers пачек одновременно), порядок строк сохраняется.
+    При isolate пул используется и при workers = 1: парсинг не занимает GIL
+    вызывающего процесса (фоновые загрузки в процессе API, jobs.py).
+    """
+    workers = PARSE_WORKERS if workers is None else workers
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        # Первая строка — заголовок
+        rows = (
+            (row_hash(row), row) for row in ws.iter_rows(min_row=2, values_only=True)
+            if any(v is not None for v in row)
+        )
+        chunks = _iter_chunks(rows, PARSE_CHUNK_SIZE)
+        if skip_known:
+            chunks = _skip_known_rows(chunks, skip_known)
+
+        if workers > 1 or isolate:
+            workers = max(workers, 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_parse_hashed_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+        else:
+            for chunk in chunks:
+                yield from _parse_hashed_chunk(chunk)
+    finally:
+        wb.close()
+
+def _skip_known_rows(chunks, skip_known) -> Iterator[list]:
+    """Убирает из пачек строки, хеши которых skip_known считает загруженными."""
+    for chunk in chunks:
+        known = skip_known([hash_ for hash_, _ in chunk])
+        if known:
+            chunk = [item for item in chunk if item[0] not in known]
+        if chunk:
+            yield chunk
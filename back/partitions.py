@@ -0,0 +1,157 @@
+# partitions.py
+# --- Помесячные секции таблицы flights (миграция 0005) ---
+# Секция месяца — flights_yYYYYmMM, FOR VALUES FROM (1-е число) TO (1-е число
+# следующего месяца). Загрузка (ingest.py) создаёт секции месяцев пачки до
+# её транзакции, отдельной короткой транзакцией: перенос строк из
+# flights_default и ATTACH PARTITION берут тяжёлые блокировки flights и не
+# должны держаться до коммита пачки. В транзакции пачки DDL нет: рейс месяца
+# без секции попадает в flights_default и переносится при создании секции.
+#
+# Секции заранее и старые секции:
+#     python partitions.py create 2025-01-01 2025-12-01  # секции месяцев диапазона
+#     python partitions.py list
+#     python partitions.py detach 2023-01-01           # отсоединить секции до даты
+#     python partitions.py detach 2023-01-01 --drop    # ... и удалить
+# Отсоединённые секции переносятся в схему ARCHIVE_SCHEMA и остаются доступны
+# как обычные таблицы. Суточная сводка (flight_daily_stats) не меняется:
+# статистика за архивные месяцы сохраняется.
+
+import sys
+from datetime import date
+
+from database import raw_connection
+
+PARENT_TABLE = "flights"
+DEFAULT_PARTITION = "flights_default"
+ARCHIVE_SCHEMA = "flights_archive"
+
+# Ключ advisory lock: секции создаются одной транзакцией за раз
+_LOCK_KEY = 7_310_043
+
+# Секции, существование которых уже проверено в этом процессе: пачки тех же
+# месяцев не открывают отдельную транзакцию. Секцию, отсоединённую позже,
+# заменяет flights_default
+_known: set[str] = set()
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+def _month_bounds(month: date) -> tuple[date, date]:
+    start = month.replace(day=1)
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+def existing_partitions(cur) -> set[str]:
+    """Имена секций flights (кроме секции по умолчанию)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits AS i
+        JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (PARENT_TABLE,))
+    return {row[0] for row in cur.fetchall()} - {DEFAULT_PARTITION}
+
+def create_partition(cur, month: date):
+    """
+    Создаёт секцию месяца. Строки месяца из flights_default переносятся в неё
+    до присоединения, иначе ATTACH PARTITION не пройдёт проверку.
+    """
+    name = partition_name(month)
+    start, end = _month_bounds(month)
+    cur.execute(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE date >= %(start)s AND date < %(end)s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, {"start": start, "end": end})
+    cur.execute(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+        (start, end),
+    )
+
+def ensure_partitions(months) -> list[str]:
+    """
+    Создаёт недостающие секции для месяцев months (date, любой день месяца)
+    в отдельной транзакции. Возвращает имена созданных секций.
+    """
+    months = {m.replace(day=1) for m in months if m is not None}
+    months = {m for m in months if partition_name(m) not in _known}
+    if not months:
+        return []
+    created = []
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        existing = existing_partitions(cur)
+        missing = [m for m in months if partition_name(m) not in existing]
+        if missing:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_KEY,))
+            # Повторная проверка: секцию мог создать параллельный загрузчик
+            existing = existing_partitions(cur)
+            for month in sorted(missing):
+                if partition_name(month) not in existing:
+                    create_partition(cur, month)
+                    created.append(partition_name(month))
+        conn.commit()
+        cur.close()
+    _known.update(partition_name(m) for m in months)
+    return created
+
+def month_range(first: date, last: date) -> list[date]:
+    """Первые числа месяцев от first до last включительно."""
+    months = []
+    month = first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = _month_bounds(month)[1]
+    return months
+
+def detach_partitions(before: date, drop: bool = False) -> list[str]:
+    """
+    Отсоединяет секции месяцев, целиком предшествующих before, и переносит
+    их в схему ARCHIVE_SCHEMA (или удаляет при drop). Возвращает имена секций.
+    """
+    detached = []
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        for name in sorted(existing_partitions(cur)):
+            year, month = int(name[-7:-3]), int(name[-2:])
+            if _month_bounds(date(year, month, 1))[1] > before:
+                continue
+            cur.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+            if drop:
+                cur.execute(f"DROP TABLE {name}")
+            else:
+                cur.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+            detached.append(name)
+        conn.commit()
+        cur.close()
+    return detached
+
+if __name__ == "__main__":
+    from migrate import apply_migrations
+
+    apply_migrations()
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        with raw_connection() as conn:
+            cur = conn.cursor()
+            print("\n".join(sorted(existing_partitions(cur))))
+            cur.close()
+    elif command == "create":
+        first = date.fromisoformat(sys.argv[2])
+        last = date.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else first
+        names = ensure_partitions(month_range(first, last))
+        print("\n".join(names) if names else "nothing to create")
+    elif command == "detach":
+        from cache import bump_data_version
+
+        names = detach_partitions(date.fromisoformat(sys.argv[2]), drop="--drop" in sys.argv)
+        print("\n".join(names) if names else "nothing to detach")
+        if names:
+            bump_data_version()  # действует при общем бэкенде кеша (CACHE_REDIS_URL)
+    else:
+        sys.exit("usage: python partitions.py [list | create YYYY-MM-DD [YYYY-MM-DD] | detach YYYY-MM-DD [--drop]]")
@@ -0,0 +1,92 @@
+# region_index.py
+# --- Поиск региона точки в памяти процесса ---
+# Полигоны russia_regions загружаются один раз, индексируются STRtree
+# (shapely) и подготавливаются (shapely.prepare). lookup() определяет регионы
+# сразу для массивов координат NumPy — без запроса к базе на каждую точку.
+# Используется для привязки регионов при загрузке, если REGION_LOOKUP=memory
+# (по умолчанию регионы определяются в PostGIS, см. regions.py).
+
+import os
+import threading
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from sqlalchemy import func
+
+import models
+from database import SessionLocal
+
+REGION_LOOKUP = os.getenv("REGION_LOOKUP", "sql")  # sql | memory
+
+# Значение lookup() для точек вне всех регионов
+NO_REGION = -1
+
+class RegionIndex:
+    """Пространственный индекс регионов: id и (подготовленные) полигоны."""
+
+    def __init__(self, ids, geoms):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.geoms = np.asarray(geoms, dtype=object)
+        shapely.prepare(self.geoms)
+        self.tree = STRtree(self.geoms)
+
+    @classmethod
+    def from_db(cls, db) -> "RegionIndex":
+        """Загружает полигоны russia_regions (WKB) из базы."""
+        rows = db.query(models.Region.id, func.ST_AsBinary(models.Region.geom)).all()
+        ids = [r[0] for r in rows]
+        geoms = shapely.from_wkb([bytes(r[1]) for r in rows])
+        return cls(ids, geoms)
+
+    def lookup(self, lons, lats) -> np.ndarray:
+        """
+        Возвращает массив id регионов для точек (lons[i], lats[i]).
+        Для точек вне регионов и NaN-координат — NO_REGION.
+        """
+        points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        result = np.full(len(points), NO_REGION, dtype=np.int64)
+        point_idx, region_idx = self.tree.query(points, predicate="within")
+        # При пересечении регионов остаётся первый найденный
+        result[point_idx[::-1]] = self.ids[region_idx[::-1]]
+        return result
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_region_index() -> RegionIndex:
+    """Индекс регионов процесса (загружается при первом обращении)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                db = SessionLocal()
+                try:
+                    _index = RegionIndex.from_db(db)
+                finally:
+                    db.close()
+    return _index
+
+def _point_lonlat(wkt: str | None) -> tuple[float, float]:
+    """
+    Координаты из WKT "POINT(lon lat)", который формирует parser.parse_message
+    (или "POINT (lon lat)" — shapely, импорт Parquet).
+    """
+    start = wkt.find("(") if wkt and wkt.startswith("POINT") else -1
+    if start < 0:
+        return np.nan, np.nan
+    lon, lat = wkt[start + 1:-1].split()
+    return float(lon), float(lat)
+
+def tag_regions(rows: list[dict], index: RegionIndex | None = None):
+    """
+    Заполняет region_id у словарей рейсов (результат parse_message)
+    по точке вылета dep_coord — одним векторным запросом на весь список.
+    """
+    if not rows:
+        return
+    index = index or get_region_index()
+    coords = np.array([_point_lonlat(row.get("dep_coord")) for row in rows], dtype=float)
+    region_ids = index.lookup(coords[:, 0], coords[:, 1])
+    for row, region_id in zip(rows, region_ids.tolist()):
+        row["region_id"] = region_id if region_id != NO_REGION else None
@@ -0,0 +1,70 @@
+# regions.py
+# --- Привязка рейсов к регионам (russia_regions) ---
+# Регион определяется по точке вылета (dep_coord) пространственным соединением
+# с russia_regions (GiST-индекс idx_russia_regions_geom), одним запросом на пачку.
+# - Новые рейсы получают регион при загрузке (ingest.py, из staging-таблицы).
+# - Рейсы без региона (загруженные раньше) привязываются пакетно:
+#       python regions.py
+#   после чего суточная сводка пересобирается.
+
+from database import raw_connection
+
+DEFAULT_BATCH_SIZE = 50000
+
+def assign_staging_regions(cur, staging: str):
+    """Заполняет region_id в staging-таблице пачки (dep_coord — WKT-текст)."""
+    cur.execute(f"""
+        UPDATE {staging} AS s
+        SET region_id = r.id
+        FROM russia_regions AS r
+        WHERE s.dep_coord IS NOT NULL
+          AND ST_Contains(r.geom, ST_GeomFromText(s.dep_coord, 4326))
+    """)
+
+_ASSIGN_SQL = """
+WITH batch AS (
+    SELECT flight_id, dep_coord::geometry AS point
+    FROM flights
+    WHERE region_id IS NULL AND dep_coord IS NOT NULL AND flight_id > %(after)s
+    ORDER BY flight_id
+    LIMIT %(limit)s
+), matched AS (
+    UPDATE flights AS f
+    SET region_id = r.id
+    FROM batch AS b
+    JOIN russia_regions AS r ON ST_Contains(r.geom, b.point)
+    WHERE f.flight_id = b.flight_id
+)
+SELECT max(flight_id), count(*) FROM batch
+"""
+
+def assign_regions(batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Привязывает к регионам рейсы без region_id пачками по flight_id
+    (коммит на пачку). Возвращает число просмотренных рейсов.
+    Точки вне всех регионов остаются без региона.
+    """
+    processed = 0
+    after = 0
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            cur.execute(_ASSIGN_SQL, {"after": after, "limit": batch_size})
+            last_id, count = cur.fetchone()
+            conn.commit()
+            if not count:
+                break
+            processed += count
+            after = last_id
+        cur.close()
+    return processed
+
+if __name__ == "__main__":
+    from migrate import apply_migrations
+    from rollup import rebuild_rollup
+    from cache import bump_data_version
+
+    apply_migrations()
+    print(f"flights checked: {assign_regions()}")
+    print(f"flight_daily_stats: {rebuild_rollup()} rows")
+    bump_data_version()  # действует при общем бэкенде кеша (CACHE_REDIS_URL)
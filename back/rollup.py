@@ -0,0 +1,105 @@
+# rollup.py
+# --- Суточная сводка рейсов (flight_daily_stats) ---
+# Таблица хранит по (дата, город, тип БПЛА, регион) количество рейсов, налёт,
+# гистограммы длительности и высоты (миграция 0006) и скетч HyperLogLog
+# бортов (миграция 0007) и используется эндпоинтами статистики вместо
+# сканирования flights.
+# Обновляется конвейером загрузки (ingest.py) в той же транзакции, что и вставка.
+#
+# Полная пересборка (после ручных правок flights или для заполнения истории):
+#     python rollup.py
+
+from database import raw_connection
+
+ROLLUP_TABLE = "flight_daily_stats"
+
+# Столбцы рейсов, из которых считается сводка: источник update/retract_rollup
+# должен их содержать
+ROLLUP_SOURCE_COLUMNS = ["date", "city", "uav_type", "region_id", "reg_number", "duration", "max_alt"]
+
+# Границы интервалов гистограмм (width_bucket): длительность в минутах и
+# максимальная высота max_alt. Интервал 0 — меньше первой границы, последний —
+# не меньше последней. Смена границ требует миграции и пересборки сводки.
+DURATION_EDGES = [1, 2, 3, 5, 7, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 360, 480, 720, 1440]
+ALTITUDE_EDGES = [10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000]
+
+def _hist_sql(value: str, edges: list, sql_type: str, weight: str) -> str:
+    array = f"ARRAY[{', '.join(map(str, edges))}]::{sql_type}[]"
+    return f"hist_sum(hist_one(width_bucket({value}, {array}), {len(edges) + 1}, {weight}))"
+
+_UPSERT_SQL = f"""
+INSERT INTO {ROLLUP_TABLE} (
+    date, city, uav_type, region_id, flights,
+    duration_seconds, duration_flights, duration_hist, alt_hist, aircraft_hll
+)
+SELECT
+    date, city, uav_type, region_id, {{sign}}count(*),
+    {{sign}}coalesce(extract(epoch FROM sum(duration)), 0),
+    {{sign}}count(duration),
+    {_hist_sql("extract(epoch FROM duration) / 60", DURATION_EDGES, "numeric", "{weight}")},
+    {_hist_sql("max_alt", ALTITUDE_EDGES, "double precision", "{weight}")},
+    {{aircraft}}
+FROM {{source}}
+GROUP BY date, city, uav_type, region_id
+ON CONFLICT (date, city, uav_type, region_id)
+DO UPDATE SET
+    flights = {ROLLUP_TABLE}.flights + EXCLUDED.flights,
+    duration_seconds = {ROLLUP_TABLE}.duration_seconds + EXCLUDED.duration_seconds,
+    duration_flights = {ROLLUP_TABLE}.duration_flights + EXCLUDED.duration_flights,
+    duration_hist = hist_add({ROLLUP_TABLE}.duration_hist, EXCLUDED.duration_hist),
+    alt_hist = hist_add({ROLLUP_TABLE}.alt_hist, EXCLUDED.alt_hist),
+    aircraft_hll = hll_union({ROLLUP_TABLE}.aircraft_hll, EXCLUDED.aircraft_hll)
+"""
+
+def rollup_upsert_sql(source: str, retract: bool = False) -> str:
+    """
+    SQL, добавляющий к сводке (или при retract — вычитающий из неё) рейсы
+    из source: таблицы, CTE или подзапроса с алиасом и столбцами ROLLUP_SOURCE_COLUMNS.
+    Из скетча HyperLogLog вычесть нельзя: при retract он не меняется (борт
+    перезаписанного рейса, сменившего город или тип, остаётся в старой группе
+    до пересборки сводки).
+    """
+    return _UPSERT_SQL.format(
+        source=source,
+        sign="-" if retract else "",
+        weight="-1" if retract else "1",
+        aircraft="NULL::bytea" if retract else "hll_agg(reg_number)",
+    )
+
+def update_rollup(cur, source: str):
+    """
+    Добавляет к сводке рейсы из таблицы source (например, staging-таблицы пачки).
+    Выполняется курсором вызывающей транзакции.
+    """
+    cur.execute(rollup_upsert_sql(source))
+
+def retract_rollup(cur, source: str):
+    """
+    Вычитает из сводки рейсы source (например, перезаписываемые при повторной
+    загрузке) и удаляет опустевшие строки сводки.
+    """
+    cur.execute(rollup_upsert_sql(source, retract=True) + " RETURNING id, flights")
+    emptied = [row_id for row_id, flights in cur.fetchall() if flights <= 0]
+    if emptied:
+        cur.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE id = ANY(%s)", (emptied,))
+
+def rebuild_rollup() -> int:
+    """Полностью пересобирает сводку по таблице flights. Возвращает число строк сводки."""
+    with raw_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"LOCK TABLE {ROLLUP_TABLE} IN EXCLUSIVE MODE")
+        cur.execute(f"DELETE FROM {ROLLUP_TABLE}")
+        update_rollup(cur, "flights")
+        cur.execute(f"SELECT count(*) FROM {ROLLUP_TABLE}")
+        rows = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        return rows
+
+if __name__ == "__main__":
+    from migrate import apply_migrations
+    from cache import bump_data_version
+
+    apply_migrations()
+    print(f"{ROLLUP_TABLE}: {rebuild_rollup()} rows")
+    bump_data_version()  # действует при общем бэкенде кеша (CACHE_REDIS_URL)
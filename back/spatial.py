@@ -0,0 +1,151 @@
+# spatial.py
+# --- Пространственные запросы к рейсам ---
+#     GET /flights/spatial?target=route&region=Московская область&limit=100
+#     GET /flights/spatial?target=dep&lon=37.6&lat=55.75&radius=5000&dimensions=uav_type
+# Фильтры (можно сочетать, нужен хотя бы один):
+# - bbox=minLon,minLat,maxLon,maxLat — пересечение с прямоугольником;
+# - lon, lat, radius (метры) — не дальше radius от точки (ST_DWithin по geography);
+# - polygon — WKT многоугольника в lon/lat;
+# - region — id или название региона russia_regions: маршрут/точка в нём
+#   или пересекает его.
+# target — какая геометрия рейса проверяется: route (маршрут), dep, dest.
+#
+# Прямоугольник, многоугольник и регион: сначала && с охватом фигуры по
+# GiST-индексу geometry(...) (миграция 0009), затем точный ST_Intersects только
+# по отобранным строкам.
+# Ответ — как у /flights/ (страница, X-Next-Cursor, fields) или, при
+# dimensions/measures, агрегация как у /flights/cube.
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from shapely import wkt as shapely_wkt
+from shapely.errors import ShapelyError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import flight_filters, flights_query, parse_fields, serialize_flight_row
+from cube import DIMENSIONS, MEASURES, aggregate, parse_list
+from database import get_async_db
+from models import Flight, Region
+
+router = APIRouter()
+
+TARGETS = {
+    "route": Flight.route_coords,
+    "dep": Flight.dep_coord,
+    "dest": Flight.dest_coord,
+}
+
+def _parse_bbox(value: str) -> list[float]:
+    try:
+        bbox = [float(v) for v in value.split(",")]
+    except ValueError:
+        bbox = []
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError("bbox — minLon,minLat,maxLon,maxLat")
+    return bbox
+
+def _parse_polygon(value: str) -> str:
+    try:
+        shape = shapely_wkt.loads(value)
+    except (ShapelyError, ValueError):
+        raise ValueError("polygon — WKT POLYGON или MULTIPOLYGON в координатах lon/lat")
+    if shape.geom_type not in ("Polygon", "MultiPolygon") or not shape.is_valid:
+        raise ValueError("polygon — корректный POLYGON или MULTIPOLYGON")
+    return shape.wkt
+
+def _intersects(column, shape):
+    """Отбор по охвату фигуры (GiST-индекс geometry(column)), затем точная проверка."""
+    geom = func.geometry(column)
+    return [geom.op("&&")(func.ST_Envelope(shape)), func.ST_Intersects(geom, shape)]
+
+def spatial_conditions(
+    target: str = "route",
+    bbox: str | None = None,
+    lon: float | None = None,
+    lat: float | None = None,
+    radius: float | None = None,
+    polygon: str | None = None,
+    region: str | None = None,
+) -> list:
+    """Условия WHERE пространственных фильтров; ошибка параметров → ValueError."""
+    if target not in TARGETS:
+        raise ValueError(f"target — одно из: {', '.join(TARGETS)}")
+    column = TARGETS[target]
+    conditions = [column.isnot(None)]
+
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = _parse_bbox(bbox)
+        conditions += _intersects(column, func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326))
+
+    if (lon, lat, radius) != (None, None, None):
+        if None in (lon, lat, radius) or radius <= 0:
+            raise ValueError("Радиус задаётся вместе: lon, lat и radius > 0 (метры)")
+        # ST_DWithin по geography сам использует GiST-индекс столбца
+        point = func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+        conditions.append(func.ST_DWithin(column, point, radius))
+
+    if polygon:
+        conditions += _intersects(column, func.ST_GeomFromText(_parse_polygon(polygon), 4326))
+
+    if region:
+        match = Region.id == int(region) if region.isdigit() else Region.nl_name_1 == region
+        region_geom = select(Region.geom).where(match).limit(1).scalar_subquery()
+        conditions += _intersects(column, region_geom)
+
+    if len(conditions) == 1:
+        raise ValueError("Нужен хотя бы один фильтр: bbox, lon/lat/radius, polygon или region")
+    return conditions
+
+@router.get("/flights/spatial")
+async def read_spatial_flights(
+    target: str = Query("route", description="Геометрия рейса: route | dep | dest"),
+    bbox: str | None = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    lon: float | None = Query(None, ge=-180, le=180),
+    lat: float | None = Query(None, ge=-90, le=90),
+    radius: float | None = Query(None, description="Радиус в метрах (с lon и lat)"),
+    polygon: str | None = Query(None, description="WKT многоугольника (lon lat)"),
+    region: str | None = Query(None, description="id или название региона"),
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    after: int | None = Query(None, description="Курсор: flight_id последнего рейса предыдущей страницы"),
+    limit: int = Query(100, ge=1, le=10000, description="Размер страницы"),
+    fields: str | None = Query(None, description="Список полей через запятую"),
+    dimensions: str | None = Query(None, description=f"Агрегация: измерения ({', '.join(DIMENSIONS)})"),
+    measures: str | None = Query(None, description=f"Агрегация: меры ({', '.join(MEASURES)})"),
+    top: int | None = Query(None, ge=1, le=1000),
+    sort: str | None = None,
+    other: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает рейсы, попадающие под пространственные фильтры и фильтры дашборда:
+    - без dimensions/measures — страницу рейсов (как /flights/, курсор в X-Next-Cursor)
+    - с dimensions/measures — агрегацию по flights (как /flights/cube)
+    """
+    filters = dict(uav_type=uav_type, city=city, startDate=startDate, endDate=endDate)
+    try:
+        conditions = spatial_conditions(target, bbox, lon, lat, radius, polygon, region)
+        flight_filters(**filters)  # проверка формата дат
+        if dimensions or measures:
+            dims = parse_list(dimensions, list(DIMENSIONS), [], "измерения")
+            meas = parse_list(measures, MEASURES, ["count"], "меры")
+            if sort is not None and sort not in meas:
+                raise ValueError(f"sort должна быть одной из мер: {', '.join(meas)}")
+        else:
+            query = flights_query(after=after, fields=parse_fields(fields), conditions=conditions, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if dimensions or measures:
+        rows = await aggregate(db, dims, meas, top=top, sort=sort, other=other, conditions=conditions, **filters)
+        return {"source": "flights", "rows": rows}
+
+    result = (await db.execute(query.limit(limit))).mappings()
+    flights = [serialize_flight_row(row) for row in result]
+    headers = {}
+    if len(flights) == limit:
+        headers["X-Next-Cursor"] = str(flights[-1]["flight_id"])
+    return JSONResponse(content=flights, headers=headers)
@@ -0,0 +1,145 @@
+# tiles.py
+# --- Векторные тайлы (MVT) для карты ---
+# Слои тайла:
+# - routes: маршруты рейсов
+# - departures: точки вылета; на мелких масштабах (z < TILE_CLUSTER_MAX_ZOOM)
+#   агрегируются в ячейки сетки с количеством рейсов flights
+# Маршрутов и неагрегированных точек — не более TILE_FEATURE_LIMIT на слой
+# (первые по flight_id, чтобы тайл не менялся от запроса к запросу), на мелких
+# масштабах маршруты упрощаются до размера пикселя тайла.
+# Отбор по тайлу — в плоских координатах lon/lat (&& и ST_Intersects по
+# geometry(...), GiST-индексы миграции 0009): охват тайла в Web Mercator —
+# прямоугольник в lon/lat, а geography соединила бы его углы дугами большого
+# круга и на мелких масштабах теряла бы рейсы у краёв.
+# Тайлы кешируются (cache.py) и сбрасываются при загрузке новых данных.
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, select, literal_column
+from sqlalchemy.orm import Session
+
+import models
+from cache import cached_response, cache_key
+from crud import flight_filters
+from database import get_db
+
+router = APIRouter()
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# Ячеек сетки агрегации на сторону тайла
+TILE_GRID_CELLS = 64
+TILE_CLUSTER_MAX_ZOOM = int(os.getenv("TILE_CLUSTER_MAX_ZOOM", "10"))
+TILE_FEATURE_LIMIT = int(os.getenv("TILE_FEATURE_LIMIT", "5000"))
+TILE_CACHE_TTL = float(os.getenv("TILE_CACHE_TTL", "3600"))
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Длина экватора в Web Mercator (EPSG:3857), м
+_WORLD_SIZE = 40075016.685578488
+
+def _mvt_geom(geom, bounds):
+    return func.ST_AsMVTGeom(geom, bounds, TILE_EXTENT, TILE_BUFFER, True)
+
+def _in_area(column, area):
+    """Отбор по охвату тайла (GiST-индекс geometry(column)), затем точная проверка."""
+    geom = func.geometry(column)
+    return [column.isnot(None), geom.op("&&")(area), func.ST_Intersects(geom, area)]
+
+def tile_query(z: int, x: int, y: int, **filters):
+    """SELECT одного bytea с MVT-тайлом (слои routes и departures)."""
+    flight = models.Flight
+    bounds = func.ST_TileEnvelope(z, x, y)
+    # Охват тайла в lon/lat (прямоугольник) для GiST-индексов geometry(...)
+    area = func.ST_Transform(bounds, 4326)
+    conditions = flight_filters(**filters)
+
+    route_line = func.ST_Transform(func.geometry(flight.route_coords), 3857)
+    if z < TILE_CLUSTER_MAX_ZOOM:
+        # Точки маршрута ближе пикселя тайла друг к другу на карте не видны
+        route_line = func.ST_Simplify(route_line, _WORLD_SIZE / (2 ** z) / TILE_EXTENT)
+    routes = (
+        select(
+            flight.flight_id,
+            flight.uav_type,
+            flight.city,
+            _mvt_geom(route_line, bounds).label("geom"),
+        )
+        .where(*_in_area(flight.route_coords, area), *conditions)
+        .order_by(flight.flight_id)
+        .limit(TILE_FEATURE_LIMIT)
+        .subquery("routes")
+    )
+
+    dep_point = func.ST_Transform(func.geometry(flight.dep_coord), 3857)
+    dep_filter = [*_in_area(flight.dep_coord, area), *conditions]
+    if z < TILE_CLUSTER_MAX_ZOOM:
+        # Агрегация точек в ячейки сетки: размер ответа не зависит от числа рейсов
+        cell = _WORLD_SIZE / (2 ** z) / TILE_GRID_CELLS
+        snapped = func.ST_SnapToGrid(dep_point, cell)
+        departures = (
+            select(
+                func.count().label("flights"),
+                _mvt_geom(snapped, bounds).label("geom"),
+            )
+            .where(*dep_filter)
+            .group_by(snapped)
+            .subquery("departures")
+        )
+    else:
+        departures = (
+            select(
+                flight.flight_id,
+                flight.uav_type,
+                flight.city,
+                _mvt_geom(dep_point, bounds).label("geom"),
+            )
+            .where(*dep_filter)
+            .order_by(flight.flight_id)
+            .limit(TILE_FEATURE_LIMIT)
+            .subquery("departures")
+        )
+
+    def layer(subquery):
+        return (
+            select(func.ST_AsMVT(literal_column(subquery.name), subquery.name, TILE_EXTENT, "geom"))
+            .select_from(subquery)
+            .scalar_subquery()
+        )
+
+    return select(layer(routes).op("||")(layer(departures)))
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+def get_tile(
+    request: Request,
+    z: int,
+    x: int,
+    y: int,
+    uav_type: str | None = None,
+    city: str | None = None,
+    startDate: str | None = None,
+    endDate: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Возвращает MVT-тайл маршрутов и точек вылета с фильтрами дашборда."""
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Некорректные координаты тайла")
+
+    filters = dict(uav_type=uav_type, city=city, startDate=startDate, endDate=endDate)
+    try:
+        flight_filters(**filters)  # проверка формата дат
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def compute() -> bytes:
+        tile = db.execute(tile_query(z, x, y, **filters)).scalar()
+        return bytes(tile) if tile else b""
+
+    return cached_response(
+        request,
+        cache_key(f"tile/{z}/{x}/{y}", **filters),
+        compute,
+        media_type=MVT_MEDIA_TYPE,
+        ttl=TILE_CACHE_TTL,
+    )
@@ -1,67 +1,34 @@
 # upload.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import psycopg2
-from psycopg2.extras import execute_values
-from parser import parse_excel
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException
+from columnar import iter_parquet
+from jobs import create_job, run_ingest_job, save_upload
 
 router = APIRouter()
 
-@router.post("/flights/import-xlsx")
-async def upload_file(file: UploadFile = File(...)):
+@router.post("/flights/import-xlsx", status_code=202)
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     try:
-        contents = await file.read()
-        df = parse_excel(contents)
-
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Файл пустой или не удалось извлечь данные")
-
-        conn = psycopg2.connect(
-            dbname="dashboard",
-            user="postgres",
-            password="root",
-            host="db",
-            port="5432"
-        )
-        cur = conn.cursor()
-
-        # Приводим данные: None оставляем, строки — как есть
-        records = []
-        for row in df.to_records(index=False):
-            row = list(row)
-
-            # dep_coord, dest_coord, route_coords — индексы 6,7,10 в df (проверь порядок!)
-            for idx in [6, 7, 10]:
-                if row[idx] is None:
-                    row[idx] = None  # оставляем None
-                else:
-                    row[idx] = str(row[idx])  # WKT-строка
-
-            records.append(tuple(row))
-
-        sql = """
-        INSERT INTO flights (
-            uav_type, reg_number, flight_date, dep_time, arr_time, duration,
-            dep_coord, dest_coord, min_alt, max_alt, route_coords, city
-        ) VALUES %s
-        """
-
-        execute_values(
-            cur, sql, records,
-            template="""
-                %s, %s, %s, %s, %s, %s,
-                CASE WHEN %s IS NULL THEN NULL ELSE ST_GeomFromText(%s, 4326) END,
-                CASE WHEN %s IS NULL THEN NULL ELSE ST_GeomFromText(%s, 4326) END,
-                %s, %s,
-                CASE WHEN %s IS NULL THEN NULL ELSE ST_GeomFromText(%s, 4326) END,
-                %s
-            """
-        )
+        # Файл сохраняется во временный файл, потоковый парсинг и загрузка
+        # в flights (COPY в staging + INSERT ... SELECT) выполняются в фоне.
+        # Прогресс — GET /jobs/{job_id}
+        path = await save_upload(file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        conn.commit()
-        cur.close()
-        conn.close()
+    job = create_job(file.filename)
+    background_tasks.add_task(run_ingest_job, job, path, require_rows=True)
 
-        return {"status": "success", "rows_inserted": len(records)}
+    return {"status": "accepted", "job_id": job["job_id"]}
 
+@router.post("/flights/import-parquet", status_code=202)
+async def upload_parquet(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    # Parquet в формате /flights/export.parquet; загрузка — тот же фоновый конвейер
+    try:
+        path = await save_upload(file, suffix=".parquet")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    job = create_job(file.filename)
+    background_tasks.add_task(run_ingest_job, job, path, require_rows=True, reader=iter_parquet)
+
+    return {"status": "accepted", "job_id": job["job_id"]}
@@ -49,8 +49,16 @@ function App() {
 
       if (!response.ok) throw new Error("Ошибка при импорте файла");
 
-      const result = await response.json();
-      alert(`Импортировано записей: ${result.imported}`);
+      // Загрузка выполняется в фоне — опрашиваем статус задачи
+      const { job_id } = await response.json();
+      let job;
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await fetch(`http://localhost:8000/jobs/${job_id}`).then((res) => res.json());
+      } while (job.status === "queued" || job.status === "running");
+
+      if (job.status === "failed") throw new Error(job.error);
+      alert(`Импортировано записей: ${job.rows_inserted}`);
     } catch (err) {
       console.error(err);
       alert("Ошибка при отправке файла");